@@ -1,8 +1,11 @@
 import os
 import time
-from typing import Dict, Any
+import asyncio
+import orjson
+from contextlib import asynccontextmanager
+from typing import Dict, Any, Optional
 from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 from loguru import logger
 from langgraph.graph import StateGraph, START, END
 from dotenv import load_dotenv
@@ -12,25 +15,131 @@ from graph.state import LeadState
 from graph.nodes.capture import capture
 from graph.nodes.enrich import enrich
 from graph.nodes.score import score
-from graph.nodes.route import route
+from graph.nodes.route import route, load_routing_rules
+from graph.nodes.similar import fetch_similar
 from graph.nodes.summarize import summarize
 from graph.nodes.nurture import nurture
-from tools.idempotency import Idem
-from tools.slack import send_lead_notification, send_high_priority_alert
+from tools.idempotency import Idem, idempotency_key, payload_fingerprint
+from tools.slack import dispatch_notifications, slack_batcher
+from tools.llm import embedding_batcher, llm_batcher, llm_cache, warm_llm_client
+from tools.hubspot import contact_batcher, contact_reader, owner_cache
+from tools.clearbit import enrichment_cache
+from tools.http_clients import close_http_clients, warm_http_clients
+from tools.threads import configure_thread_pool
 
 # Load environment variables
 load_dotenv()
 
 # Configure logging
-logger.add("logs/app.log", rotation="1 day", retention="7 days", level="INFO")
+# File writes happen on loguru's background thread, off the event loop
+logger.add(
+    "logs/app.log",
+    rotation="1 day",
+    retention="7 days",
+    level="INFO",
+    enqueue=True,
+    backtrace=False,
+    diagnose=False
+)
+
+# Background pipeline configuration
+PIPELINE_WORKERS = int(os.getenv("PIPELINE_WORKERS", "4"))
+QUEUE_MAXSIZE = int(os.getenv("QUEUE_MAXSIZE", "1000"))
+SHUTDOWN_TIMEOUT = float(os.getenv("SHUTDOWN_TIMEOUT", "30"))
+# Seconds a sender is told to wait before retrying when the queue is full
+OVERLOAD_RETRY_AFTER = os.getenv("OVERLOAD_RETRY_AFTER", "5")
+# Max seconds a ?wait=score webhook call waits for the score before falling back to 202
+SCORE_WAIT_TIMEOUT = float(os.getenv("SCORE_WAIT_TIMEOUT", "10"))
+
+# Strong references to fire-and-forget tasks so they are not garbage collected
+background_tasks = set()
+
+def spawn_background(coro) -> asyncio.Task:
+    """Run a coroutine in the background without awaiting it."""
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Warm up shared resources, start the pipeline workers and drain them on shutdown."""
+    app.state.ready = False
+    configure_thread_pool()
+    
+    # Do every one-time init here so the first leads after a worker spawn are not slowed down
+    load_routing_rules()
+    await idem.connect()
+    await enrichment_cache.connect()
+    await owner_cache.connect()
+    await llm_cache.connect()
+    warm_http_clients("clearbit", "hubspot", "openai", "slack")
+    warm_llm_client()
+    
+    app.state.queue = asyncio.Queue(maxsize=QUEUE_MAXSIZE)
+    app.state.workers = [
+        asyncio.create_task(worker_loop(app.state.queue))
+        for _ in range(PIPELINE_WORKERS)
+    ]
+    logger.info("Started {} pipeline workers (queue size {})", PIPELINE_WORKERS, QUEUE_MAXSIZE)
+    app.state.ready = True
+    
+    yield
+    
+    # Fail health checks while draining so load balancers stop sending leads
+    app.state.ready = False
+    
+    # Give in-flight leads a chance to finish before cancelling workers
+    try:
+        await asyncio.wait_for(app.state.queue.join(), timeout=SHUTDOWN_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.warning("Shutting down with {} leads still queued", app.state.queue.qsize())
+    
+    for worker in app.state.workers:
+        worker.cancel()
+    await asyncio.gather(*app.state.workers, return_exceptions=True)
+    await llm_batcher.aclose()
+    await embedding_batcher.aclose()
+    await contact_reader.aclose()
+    await contact_batcher.aclose()
+    await slack_batcher.aclose()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    await idem.close()
+    await enrichment_cache.close()
+    await owner_cache.close()
+    await llm_cache.close()
+    await close_http_clients()
+    logger.info("Pipeline workers stopped")
+    
+    # Flush log records still queued for the file sink
+    await logger.complete()
 
 # Initialize FastAPI app
 app = FastAPI(
     title="Revenue Ops Lead Router & Enricher",
     description="AI-powered lead routing and enrichment system",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
+# Score thresholds for the post-scoring branch
+ROUTE_THRESHOLD = 0.7
+NURTURE_THRESHOLD = 0.4
+
+def branch_decision(state: LeadState) -> str:
+    """Pick the next node from the lead's score and owner assignment."""
+    score_val = state.get("score", 0)
+    
+    if score_val >= ROUTE_THRESHOLD and state.get("owner"):
+        logger.info("High-scoring lead with owner, proceeding to route: {}", score_val)
+        return "route"
+    if score_val < NURTURE_THRESHOLD:
+        logger.info("Low-scoring lead, sending to nurture: {}", score_val)
+        return "nurture"
+    logger.info("Medium-scoring lead, manual review required: {}", score_val)
+    return "summarize"
+
 # Build the LangGraph workflow
 def build_workflow():
     """Build the lead processing workflow."""
@@ -39,7 +148,8 @@ def build_workflow():
     # Add nodes
     workflow.add_node("capture", capture)
     workflow.add_node("enrich", enrich)
-    workflow.add_node("score", score)
+    workflow.add_node("scoring", score)  # "score" is already a state key
+    workflow.add_node("fetch_similar", fetch_similar)
     workflow.add_node("route", route)
     workflow.add_node("summarize", summarize)
     workflow.add_node("nurture", nurture)
@@ -47,28 +157,16 @@ def build_workflow():
     # Add edges
     workflow.add_edge(START, "capture")
     workflow.add_edge("capture", "enrich")
-    workflow.add_edge("enrich", "score")
+    
+    # Scoring and the similar-account lookup both only need enrichment, so
+    # they run as parallel branches in the same step; the branch below is
+    # taken once both have finished.
+    workflow.add_edge("enrich", "scoring")
+    workflow.add_edge("enrich", "fetch_similar")
     
     # Conditional branching based on score and owner assignment
-    def branch_decision(state: LeadState) -> str:
-        score_val = state.get("score", 0)
-        owner = state.get("owner")
-        
-        if score_val >= 0.7 and owner:
-            logger.info(f"High-scoring lead with owner, proceeding to route: {score_val}")
-            return "route"
-        elif score_val < 0.4:
-            logger.info(f"Low-scoring lead, sending to nurture: {score_val}")
-            state["decided_path"] = "nurture"
-            return "nurture"
-        else:
-            logger.info(f"Medium-scoring lead, manual review required: {score_val}")
-            state["decided_path"] = "manual_review"
-            return "summarize"
-    
-    # Add conditional edges
     workflow.add_conditional_edges(
-        "score", 
+        "scoring", 
         branch_decision, 
         {
             "route": "route", 
@@ -81,6 +179,7 @@ def build_workflow():
     workflow.add_edge("route", "summarize")
     workflow.add_edge("summarize", END)
     workflow.add_edge("nurture", END)
+    workflow.add_edge("fetch_similar", END)
     
     return workflow.compile()
 
@@ -88,11 +187,76 @@ def build_workflow():
 app_graph = build_workflow()
 idem = Idem()
 
+async def process_lead(payload: Dict[str, Any], key: str, score_future: Optional[asyncio.Future] = None) -> Dict[str, Any]:
+    """
+    Run the workflow for a single lead and schedule its Slack notification.
+    
+    Args:
+        payload: Raw webhook payload
+        key: Idempotency key
+        score_future: Resolved with the scoring node's update as soon as it
+            finishes, while routing/summarization carry on
+    """
+    start_time = time.time()
+    
+    # Initialize state
+    initial_state = {
+        "raw": payload,
+        "errors": [],
+        "notifications": [],
+        "score_reasons": []
+    }
+    
+    # Execute workflow
+    logger.info("Starting workflow execution for lead: {}", key)
+    result = initial_state
+    try:
+        async for mode, chunk in app_graph.astream(initial_state, stream_mode=["updates", "values"]):
+            if mode == "values":
+                result = chunk
+            elif score_future is not None and "scoring" in chunk and not score_future.done():
+                score_future.set_result(chunk["scoring"])
+    except Exception as e:
+        if score_future is not None and not score_future.done():
+            score_future.set_exception(e)
+        raise
+    
+    # Never leave a waiting webhook hanging if the graph ended without scoring
+    if score_future is not None and not score_future.done():
+        score_future.set_result({"score": result.get("score"), "score_reasons": result.get("score_reasons", [])})
+    
+    # Notify Slack in the background so the worker can move on
+    spawn_background(dispatch_notifications(result))
+    
+    # Log completion
+    processing_time = time.time() - start_time
+    logger.info("Lead processing completed in {:.2f}s: {}", processing_time, result.get('lead_id', 'unknown'))
+    
+    return result
+
+async def worker_loop(queue: asyncio.Queue):
+    """Drain queued leads, processing one at a time."""
+    while True:
+        payload, key, score_future = await queue.get()
+        try:
+            await process_lead(payload, key, score_future)
+        except Exception as e:
+            logger.error("Lead processing failed for {}: {}", key, e)
+            if score_future is not None and not score_future.done():
+                score_future.set_exception(e)
+        finally:
+            queue.task_done()
+
 @app.post("/webhooks/lead")
 async def ingest_lead(req: Request):
     """
     Main webhook endpoint for lead ingestion.
     
+    The lead is queued for background processing and acknowledged with
+    202 Accepted; 503 is returned when the queue is full. Callers that
+    need the score pass ?wait=score and get 200 as soon as scoring is
+    done (routing, CRM and Slack still finish in the background).
+    
     Expected payload:
     {
         "email": "john.doe@company.com",
@@ -103,89 +267,93 @@ async def ingest_lead(req: Request):
         "country": "US"
     }
     """
-    start_time = time.time()
-    
     try:
         # Parse request
-        payload = await req.json()
-        logger.info(f"Received lead webhook: {payload.get('email', 'unknown')}")
+        try:
+            payload = orjson.loads(await req.body())
+        except orjson.JSONDecodeError as e:
+            logger.warning("Rejected malformed lead payload: {}", e)
+            return ORJSONResponse(
+                status_code=400,
+                content={"status": "invalid", "message": "Request body is not valid JSON"}
+            )
+        logger.info("Received lead webhook: {}", payload.get('email', 'unknown'))
         
         # Check idempotency
-        key = payload.get("event_id") or payload.get("email") or str(time.time())
-        if not idem.check_and_set(key):
-            logger.warning(f"Duplicate lead ignored: {key}")
-            return JSONResponse(
+        fingerprint = payload_fingerprint(payload)
+        key = idempotency_key(payload, fingerprint)
+        if not await idem.check_and_set(key, fingerprint=fingerprint):
+            stored_fingerprint = await idem.get_fingerprint(key)
+            if stored_fingerprint and stored_fingerprint != fingerprint:
+                logger.warning("Idempotency key reused with a different payload: {}", key)
+                return ORJSONResponse(
+                    status_code=409,
+                    content={"status": "conflict", "message": "Key already used for a different payload"}
+                )
+            
+            logger.warning("Duplicate lead ignored: {}", key)
+            return ORJSONResponse(
                 status_code=200,
                 content={"status": "duplicate_ignored", "message": "Lead already processed"}
             )
         
-        # Initialize state
-        initial_state = {
-            "raw": payload,
-            "errors": [],
-            "notifications": [],
-            "score_reasons": []
-        }
-        
-        # Execute workflow
-        logger.info(f"Starting workflow execution for lead: {key}")
-        result = app_graph.invoke(initial_state)
-        
-        # Calculate processing time
-        processing_time = time.time() - start_time
-        
-        # Send notifications based on score
+        # Hand off to the background workers
+        score_future = None
+        if req.query_params.get("wait") == "score":
+            score_future = asyncio.get_running_loop().create_future()
         try:
-            if result.get("score", 0) >= 0.8:
-                # High-priority lead - send alert
-                slack_ts = send_high_priority_alert(result)
-                if slack_ts:
-                    result["notifications"].append(f"high_priority_slack:{slack_ts}")
-            else:
-                # Regular lead notification
-                slack_ts = send_lead_notification(result)
-                if slack_ts:
-                    result["notifications"].append(f"slack:{slack_ts}")
-        except Exception as e:
-            logger.error(f"Slack notification failed: {e}")
-            result.setdefault("errors", []).append(f"slack_notification_failed: {e}")
+            req.app.state.queue.put_nowait((payload, key, score_future))
+        except asyncio.QueueFull:
+            logger.warning("Lead queue full, rejecting lead: {}", key)
+            # Release the key so the sender's retry is not treated as a duplicate
+            await idem.clear_key(key)
+            return ORJSONResponse(
+                status_code=503,
+                headers={"Retry-After": OVERLOAD_RETRY_AFTER},
+                content={"status": "overloaded", "message": "Lead queue is full, retry later"}
+            )
         
-        # Log completion
-        logger.info(f"Lead processing completed in {processing_time:.2f}s: {result.get('lead_id', 'unknown')}")
+        if score_future is not None:
+            try:
+                scored = await asyncio.wait_for(asyncio.shield(score_future), timeout=SCORE_WAIT_TIMEOUT)
+                return ORJSONResponse(
+                    status_code=200,
+                    content={
+                        "status": "scored",
+                        "key": key,
+                        "score": scored.get("score"),
+                        "score_reasons": scored.get("score_reasons", [])
+                    }
+                )
+            except asyncio.TimeoutError:
+                logger.warning("Score not ready within {}s, acknowledging: {}", SCORE_WAIT_TIMEOUT, key)
         
-        # Return success response
-        return JSONResponse(
-            status_code=200,
-            content={
-                "status": "success",
-                "lead_id": result.get("lead_id"),
-                "processing_time": processing_time,
-                "score": result.get("score"),
-                "owner": result.get("owner"),
-                "path": result.get("decided_path"),
-                "crm_id": result.get("crm_record_id")
-            }
+        return ORJSONResponse(
+            status_code=202,
+            content={"status": "accepted", "key": key}
         )
         
     except Exception as e:
-        logger.error(f"Lead processing failed: {e}")
-        return JSONResponse(
+        logger.error("Lead ingestion failed: {}", e)
+        return ORJSONResponse(
             status_code=500,
             content={"status": "error", "message": str(e)}
         )
 
 @app.get("/health")
-def health():
-    """Health check endpoint."""
-    return {
-        "status": "healthy",
+def health(req: Request):
+    """Health check endpoint; returns 503 until startup completes and while shutting down."""
+    ready = getattr(req.app.state, "ready", False)
+    content = {
+        "status": "healthy" if ready else "starting",
         "timestamp": time.time(),
         "version": "1.0.0",
         "services": {
             "redis": "connected" if idem.r else "disconnected",
-            "workflow": "ready"
+            "workflow": "ready" if ready else "not_ready"
         }
     }
+    return ORJSONResponse(status_code=200 if ready else 503, content=content)
 
 @app.get("/admin/leads/{lead_id}")
 async def get_lead_status(lead_id: str):
@@ -215,9 +383,12 @@ async def retry_lead(lead_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/metrics")
-def get_metrics():
+def get_metrics(req: Request):
     """Get system metrics."""
     return {
+        "queue_depth": req.app.state.queue.qsize(),
+        "queue_capacity": QUEUE_MAXSIZE,
+        "pipeline_workers": PIPELINE_WORKERS,
         "total_leads_processed": "implement_counter",
         "average_processing_time": "implement_timing",
         "success_rate": "implement_calculation",
@@ -227,8 +398,8 @@ def get_metrics():
 # Error handlers
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
-    logger.error(f"Unhandled exception: {exc}")
-    return JSONResponse(
+    logger.error("Unhandled exception: {}", exc)
+    return ORJSONResponse(
         status_code=500,
         content={"status": "error", "message": "Internal server error"}
     )
@@ -241,10 +412,13 @@ if __name__ == "__main__":
     
     logger.info("Starting Revenue Ops Lead Router & Enricher")
     
+    # Development server; production runs under gunicorn (see gunicorn.conf.py)
     uvicorn.run(
         "app:app",
         host="0.0.0.0",
         port=8000,
-        reload=True,
+        reload=os.getenv("ENVIRONMENT", "development") == "development",
+        loop="uvloop",
+        http="httptools",
         log_level="info"
     )
@@ -2,17 +2,19 @@ from typing import Dict, Any
 from graph.state import LeadState
 from loguru import logger
 
-REQUIRED_FIELDS = ["email", "company", "full_name"]
+REQUIRED_FIELDS = frozenset({"email", "company", "full_name"})
 
-def capture(state: LeadState) -> LeadState:
+async def capture(state: LeadState) -> Dict[str, Any]:
     """Normalize and validate incoming lead payload."""
-    logger.info(f"Starting capture for lead: {state.get('raw', {}).get('email', 'unknown')}")
+    raw = state.get("raw") or {}
+    properties = raw.get("properties") or {}
+    errors = []
     
-    raw = state.get("raw", {})
+    logger.info("Starting capture for lead: {}", raw.get('email', 'unknown'))
     
     # Normalize common fields
-    email = (raw.get("email") or raw.get("properties", {}).get("email", {}).get("value", "")).lower()
-    company = raw.get("company") or raw.get("company_name") or raw.get("properties", {}).get("company")
+    email = (raw.get("email") or properties.get("email", {}).get("value", "")).lower()
+    company = raw.get("company") or raw.get("company_name") or properties.get("company")
     domain = (raw.get("website") or raw.get("domain") or "").replace("https://", "").replace("http://", "").split("/")[0]
     
     normalized = {
@@ -26,12 +28,12 @@ def capture(state: LeadState) -> LeadState:
     }
     
     # Validate required fields
-    missing_fields = [field for field in REQUIRED_FIELDS if not normalized.get(field)]
+    # Checked on normalized values so aliases (company_name, first/last name) count
+    missing_fields = sorted(REQUIRED_FIELDS.difference(field for field, value in normalized.items() if value))
     if missing_fields:
-        state.setdefault("errors", []).append(f"Missing required fields: {missing_fields}")
+        errors.append(f"Missing required fields: {missing_fields}")
     
-    state["normalized"] = normalized
-    state["lead_id"] = raw.get("id") or email
+    lead_id = raw.get("id") or email
     
-    logger.info(f"Capture completed for {state['lead_id']}")
-    return state
+    logger.info("Capture completed for {}", lead_id)
+    return {"normalized": normalized, "lead_id": lead_id, "errors": errors}
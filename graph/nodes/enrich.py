@@ -1,30 +1,27 @@
+from typing import Dict, Any
 from graph.state import LeadState
-from tools.clearbit import enrich_domain_person
+from tools.clearbit import enrich_domain_person_async
 from loguru import logger
 
-def enrich(state: LeadState) -> LeadState:
+async def enrich(state: LeadState) -> Dict[str, Any]:
     """Enrich lead data with external sources (Clearbit, Apollo, etc.)."""
-    logger.info(f"Starting enrichment for lead: {state.get('lead_id', 'unknown')}")
-    
-    norm = state.get("normalized", {})
+    lead_id = state.get("lead_id", "unknown")
+    norm = state.get("normalized") or {}
+    logger.info("Starting enrichment for lead: {}", lead_id)
     
     if not norm.get("domain") and not norm.get("email"):
         logger.warning("No domain or email available for enrichment")
-        state["enrichment"] = {}
-        return state
+        return {"enrichment": {}}
     
     try:
-        data = enrich_domain_person(
+        data = await enrich_domain_person_async(
             domain=norm.get("domain"), 
             email=norm.get("email")
         )
-        state["enrichment"] = data
-        logger.info(f"Enrichment completed successfully for {state.get('lead_id')}")
+        logger.info("Enrichment completed successfully for {}", lead_id)
+        return {"enrichment": data}
         
     except Exception as e:
         error_msg = f"Enrichment failed: {str(e)}"
         logger.error(error_msg)
-        state.setdefault("errors", []).append(error_msg)
-        state["enrichment"] = {}
-    
-    return state
+        return {"enrichment": {}, "errors": [error_msg]}
@@ -1,14 +1,12 @@
+from typing import Dict, Any
 from graph.state import LeadState
 from loguru import logger
 
-def nurture(state: LeadState) -> LeadState:
+async def nurture(state: LeadState) -> Dict[str, Any]:
     """Handle low-scoring leads by adding them to nurturing sequences."""
-    logger.info(f"Starting nurture process for lead: {state.get('lead_id', 'unknown')}")
+    logger.info("Starting nurture process for lead: {}", state.get('lead_id', 'unknown'))
     
     try:
-        # Set the decided path
-        state["decided_path"] = "nurture"
-        
         # Add to low-touch sequence
         # This could integrate with marketing automation tools like HubSpot, Marketo, etc.
         nurture_data = {
@@ -19,8 +17,6 @@ def nurture(state: LeadState) -> LeadState:
             "reasons": state.get("score_reasons", [])
         }
         
-        state["nurture_data"] = nurture_data
-        
         # Create a task in CRM for follow-up
         # This would typically call the CRM API to create a task
         task_data = {
@@ -30,8 +26,6 @@ def nurture(state: LeadState) -> LeadState:
             "assigned_to": "marketing@company.com"
         }
         
-        state["nurture_task"] = task_data
-        
         # Schedule automated email sequence
         # This could integrate with email marketing platforms
         email_sequence = {
@@ -43,17 +37,22 @@ def nurture(state: LeadState) -> LeadState:
             ]
         }
         
-        state["email_sequence"] = email_sequence
+        logger.info("Nurture process completed for {}", state.get('lead_id'))
         
-        logger.info(f"Nurture process completed for {state.get('lead_id')}")
+        return {
+            "decided_path": "nurture",
+            "nurture_data": nurture_data,
+            "nurture_task": task_data,
+            "email_sequence": email_sequence
+        }
         
     except Exception as e:
         error_msg = f"Nurture process failed: {str(e)}"
         logger.error(error_msg)
-        state.setdefault("errors", []).append(error_msg)
         
         # Ensure basic nurture state is set
-        state["decided_path"] = "nurture"
-        state["nurture_data"] = {"sequence_name": "fallback_nurture"}
-    
-    return state
+        return {
+            "decided_path": "nurture",
+            "nurture_data": {"sequence_name": "fallback_nurture"},
+            "errors": [error_msg]
+        }
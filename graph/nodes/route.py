@@ -1,5 +1,6 @@
 import os
-import json
+import orjson
+from typing import Dict, Any
 from graph.state import LeadState
 from tools.hubspot import find_owner_by_rules, create_or_update_contact
 from loguru import logger
@@ -7,71 +8,95 @@ from loguru import logger
 # Load routing configuration
 ROUTING_CONFIG_PATH = os.getenv("ROUTING_JSON", "./infra/routing.json")
 
+# Parsed routing rules, reused until the file's mtime changes
+_ROUTES_CACHE = {"mtime": None, "data": None}
+
 def load_routing_rules():
-    """Load routing rules from configuration file."""
+    """Load routing rules from configuration file, re-reading it only when it changes."""
     try:
-        with open(ROUTING_CONFIG_PATH, "r") as f:
-            return json.load(f)
+        mtime = os.stat(ROUTING_CONFIG_PATH).st_mtime
+        if _ROUTES_CACHE["data"] is not None and _ROUTES_CACHE["mtime"] == mtime:
+            return _ROUTES_CACHE["data"]
+        
+        with open(ROUTING_CONFIG_PATH, "rb") as f:
+            # Normalize territory keys once here rather than per lead
+            routes = {key.upper(): owner for key, owner in orjson.loads(f.read()).items()}
+        
+        _ROUTES_CACHE["mtime"] = mtime
+        _ROUTES_CACHE["data"] = routes
+        return routes
     except FileNotFoundError:
-        logger.warning(f"Routing config not found at {ROUTING_CONFIG_PATH}, using defaults")
+        logger.warning("Routing config not found at {}, using defaults", ROUTING_CONFIG_PATH)
         return {
             "US": "us-team@company.com",
             "CA": "canada-team@company.com", 
             "UK": "emea-team@company.com",
             "DEFAULT": "general@company.com"
         }
-    except json.JSONDecodeError:
-        logger.error(f"Invalid JSON in routing config {ROUTING_CONFIG_PATH}")
-        return {"DEFAULT": "general@company.com"}
+    except orjson.JSONDecodeError:
+        logger.error("Invalid JSON in routing config {}", ROUTING_CONFIG_PATH)
+        # Keep serving the last good rules while the file is being fixed
+        return _ROUTES_CACHE["data"] or {"DEFAULT": "general@company.com"}
 
-def route(state: LeadState) -> LeadState:
+async def route(state: LeadState) -> Dict[str, Any]:
     """Route lead to appropriate sales owner and create CRM record."""
-    logger.info(f"Starting routing for lead: {state.get('lead_id', 'unknown')}")
+    lead_id = state.get("lead_id", "unknown")
+    norm = state.get("normalized") or {}
+    logger.info("Starting routing for lead: {}", lead_id)
+    
+    errors = []
     
     try:
         # Load routing rules
         routes = load_routing_rules()
         
         # Find owner based on rules
-        owner = find_owner_by_rules(
-            state.get("normalized", {}), 
-            state.get("enrichment", {}), 
+        owner = await find_owner_by_rules(
+            norm, 
+            state.get("enrichment") or {}, 
             routes
         )
         
-        state["owner"] = owner
-        logger.info(f"Assigned owner: {owner}")
+        logger.info("Assigned owner: {}", owner)
         
         # Create or update CRM record
         try:
-            crm_record = create_or_update_contact(state)
-            state["crm_record_id"] = crm_record.get("id") if crm_record else None
+            crm_record = await create_or_update_contact(state)
+            crm_record_id = crm_record.get("id") if crm_record else None
             
-            if state["crm_record_id"]:
-                logger.info(f"CRM record created/updated: {state['crm_record_id']}")
+            if crm_record_id:
+                logger.info("CRM record created/updated: {}", crm_record_id)
             else:
                 logger.warning("CRM record creation failed")
                 
         except Exception as e:
             error_msg = f"CRM operation failed: {str(e)}"
             logger.error(error_msg)
-            state.setdefault("errors", []).append(error_msg)
-            state["crm_record_id"] = None
+            errors.append(error_msg)
+            crm_record_id = None
         
         # Set routing reason
-        country = state.get("normalized", {}).get("country", "unknown")
-        state["route_reason"] = f"Matched territory {country} → {owner}"
+        country = norm.get("country", "unknown")
+        route_reason = f"Matched territory {country} → {owner}"
         
-        logger.info(f"Routing completed for {state.get('lead_id')}")
+        logger.info("Routing completed for {}", lead_id)
         
     except Exception as e:
         error_msg = f"Routing failed: {str(e)}"
         logger.error(error_msg)
-        state.setdefault("errors", []).append(error_msg)
+        errors.append(error_msg)
         
         # Fallback to default owner
         routes = load_routing_rules()
-        state["owner"] = routes.get("DEFAULT", "unassigned@company.com")
-        state["route_reason"] = "Fallback to default owner due to routing error"
+        return {
+            "owner": routes.get("DEFAULT", "unassigned@company.com"),
+            "route_reason": "Fallback to default owner due to routing error",
+            "errors": errors
+        }
     
-    return state
+    return {
+        "owner": owner,
+        "crm_record_id": crm_record_id,
+        "route_reason": route_reason,
+        "errors": errors
+    }
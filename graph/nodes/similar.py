@@ -0,0 +1,21 @@
+from typing import Dict, Any
+from graph.state import LeadState
+from tools.pinecone_store import embed_account_features, similar_accounts
+from tools.threads import run_blocking
+from loguru import logger
+
+async def fetch_similar(state: LeadState) -> Dict[str, Any]:
+    """Find similar historical accounts; runs alongside scoring once enrichment is available."""
+    logger.info("Starting similar account lookup for lead: {}", state.get('lead_id', 'unknown'))
+    
+    try:
+        # Embeddings are batched across concurrent leads; the Pinecone SDK is blocking
+        vector = await embed_account_features(state)
+        similar_accounts_list = await run_blocking("pinecone", similar_accounts, state, vector)
+        logger.info("Found {} similar accounts", len(similar_accounts_list))
+        return {"similar_accounts": similar_accounts_list}
+        
+    except Exception as e:
+        error_msg = f"Similar account lookup failed: {str(e)}"
+        logger.error(error_msg)
+        return {"similar_accounts": [], "errors": [error_msg]}
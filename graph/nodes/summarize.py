@@ -1,48 +1,35 @@
+from typing import Dict, Any
 from graph.state import LeadState
-from tools.pinecone_store import similar_accounts
-from tools.llm import summarize_for_ae
+from tools.llm import summarize_for_ae_async
 from loguru import logger
 
-def summarize(state: LeadState) -> LeadState:
-    """Generate lead summary and find similar accounts for context."""
-    logger.info(f"Starting summarization for lead: {state.get('lead_id', 'unknown')}")
+async def summarize(state: LeadState) -> Dict[str, Any]:
+    """Generate lead summary using the similar accounts found by fetch_similar."""
+    lead_id = state.get("lead_id", "unknown")
+    logger.info("Starting summarization for lead: {}", lead_id)
     
+    similar_accounts_list = state.get("similar_accounts", [])
+    errors = []
+    
+    # Generate LLM summary for sales team
     try:
-        # Find similar accounts using vector similarity
-        similar_accounts_list = similar_accounts(state)
-        state["similar_accounts"] = similar_accounts_list
-        
-        logger.info(f"Found {len(similar_accounts_list)} similar accounts")
-        
-        # Generate LLM summary for sales team
-        try:
-            summary = summarize_for_ae(state, similar_accounts_list)
-            logger.info("LLM summary generated successfully")
-            
-            # Store summary in state (could be sent to Slack/CRM)
-            state["summary"] = summary
-            
-        except Exception as e:
-            error_msg = f"LLM summarization failed: {str(e)}"
-            logger.error(error_msg)
-            state.setdefault("errors", []).append(error_msg)
-            
-            # Fallback to basic summary
-            state["summary"] = f"Lead: {state.get('normalized', {}).get('full_name')} from {state.get('normalized', {}).get('company')} (Score: {state.get('score', 0):.2f})"
-        
-        # Optional: Send to Slack or CRM
-        # await send_to_slack(state)
-        # await attach_to_crm(state)
-        
-        logger.info(f"Summarization completed for {state.get('lead_id')}")
+        summary = await summarize_for_ae_async(state, similar_accounts_list)
+        logger.info("LLM summary generated successfully")
         
     except Exception as e:
-        error_msg = f"Summarization failed: {str(e)}"
+        error_msg = f"LLM summarization failed: {str(e)}"
         logger.error(error_msg)
-        state.setdefault("errors", []).append(error_msg)
+        errors.append(error_msg)
         
-        # Ensure we have at least basic state
-        state["similar_accounts"] = []
-        state["summary"] = "Summary generation failed"
+        # Fallback to basic summary
+        norm = state.get("normalized") or {}
+        summary = f"Lead: {norm.get('full_name')} from {norm.get('company')} (Score: {state.get('score', 0):.2f})"
+    
+    # Optional: Send to Slack or CRM
+    # await send_to_slack(state)
+    # await attach_to_crm(state)
+    
+    logger.info("Summarization completed for {}", lead_id)
     
-    return state
+    # Store summary in state (could be sent to Slack/CRM)
+    return {"summary": summary, "errors": errors}
@@ -1,17 +1,31 @@
-from typing import TypedDict, Optional, List, Dict, Any
+import operator
+from typing import TypedDict, Optional, List, Dict, Any, Annotated
+
+def merge_dicts(left: Optional[Dict[str, Any]], right: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Reducer that shallow-merges dict updates, later keys winning."""
+    return {**(left or {}), **(right or {})}
 
 class LeadState(TypedDict, total=False):
-    """State shape for the lead processing workflow."""
+    """
+    State shape for the lead processing workflow.
+    
+    Nodes return partial updates; fields written by parallel branches
+    carry a reducer so LangGraph merges their writes instead of rejecting them.
+    """
     lead_id: str
     raw: Dict[str, Any]              # original webhook payload
     normalized: Dict[str, Any]       # email, domain, company, title, country, etc.
-    enrichment: Dict[str, Any]       # firmographics, technographics, headcount...
+    enrichment: Annotated[Dict[str, Any], merge_dicts]  # firmographics, technographics, headcount...
     score: float
-    score_reasons: List[str]
+    score_reasons: Annotated[List[str], operator.add]
     owner: Optional[str]             # userId / email in CRM
     route_reason: str
-    similar_accounts: List[Dict[str, Any]]
+    similar_accounts: Annotated[List[Dict[str, Any]], operator.add]
+    summary: str                     # AE-ready lead summary
     crm_record_id: Optional[str]
-    notifications: List[str]         # Slack message ids
-    errors: List[str]
+    notifications: Annotated[List[str], operator.add]  # Slack message ids
+    errors: Annotated[List[str], operator.add]
     decided_path: str                # "qualify" | "nurture" | "manual_review"
+    nurture_data: Dict[str, Any]
+    nurture_task: Dict[str, Any]
+    email_sequence: Dict[str, Any]
@@ -0,0 +1,18 @@
+# Production server configuration: gunicorn -c gunicorn.conf.py app:app
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+
+# Uvicorn workers run uvloop + httptools when installed (uvicorn[standard])
+worker_class = "uvicorn.workers.UvicornWorker"
+workers = int(os.getenv("WORKERS") or (os.cpu_count() or 1) * 2 + 1)
+worker_connections = 1000
+preload_app = True
+
+# Leave room for the lifespan to drain the lead queue on shutdown
+graceful_timeout = int(float(os.getenv("SHUTDOWN_TIMEOUT", "30"))) + 5
+timeout = 60
+keepalive = 5
+
+loglevel = os.getenv("LOG_LEVEL", "info").lower()
+accesslog = "-"
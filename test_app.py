@@ -46,7 +46,7 @@ def test_lead_webhook(base_url="http://localhost:8000"):
             timeout=30
         )
         
-        if response.status_code == 200:
+        if response.status_code == 202:
             data = response.json()
             print(f"✅ Lead webhook test passed: {data}")
             return True
@@ -78,7 +78,7 @@ def test_duplicate_lead(base_url="http://localhost:8000"):
             timeout=30
         )
         
-        if response1.status_code != 200:
+        if response1.status_code != 202:
             print(f"❌ First lead request failed: {response1.status_code}")
             return False
         
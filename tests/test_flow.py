@@ -1,7 +1,10 @@
 import pytest
 import json
+import asyncio
 import os
 import sys
+import time
+import typing
 from unittest.mock import patch, MagicMock
 
 # Add project root to path
@@ -10,37 +13,65 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from graph.state import LeadState
 from graph.nodes.capture import capture
 from graph.nodes.enrich import enrich
-from graph.nodes.score import score
-from graph.nodes.route import route
+from graph.nodes.score import score, rule_score
+from graph.nodes.route import route, load_routing_rules
+from graph.nodes.similar import fetch_similar
 from graph.nodes.summarize import summarize
 from graph.nodes.nurture import nurture
-from tools.idempotency import Idem
+from tools.idempotency import Idem, idempotency_key, payload_fingerprint
+from tools.batching import AsyncBatcher
+from tools.threads import run_blocking
+from tools.cache import RedisCache
+
+# Reducers declared on LeadState, keyed by field name
+REDUCERS = {
+    key: hint.__metadata__[0]
+    for key, hint in typing.get_type_hints(LeadState, include_extras=True).items()
+    if hasattr(hint, "__metadata__")
+}
+
+def run_node(node, state):
+    """Run an async node and fold its partial update into state, as LangGraph does."""
+    update = asyncio.run(node(state))
+    merged = dict(state)
+    for key, value in update.items():
+        reducer = REDUCERS.get(key)
+        merged[key] = reducer(merged[key], value) if reducer and key in merged else value
+    return merged
+
+SAMPLE_LEAD = {
+    "email": "john.doe@acme.com",
+    "company": "Acme Corp",
+    "full_name": "John Doe",
+    "title": "Director of Engineering",
+    "source": "website",
+    "country": "US"
+}
+
+# The sample lead after each pipeline stage, built once per test class
+# (nodes return new dicts, so tests never mutate these shared states)
+@pytest.fixture(scope="class")
+def captured_state():
+    return run_node(capture, {"raw": SAMPLE_LEAD, "errors": [], "notifications": [], "score_reasons": []})
+
+@pytest.fixture(scope="class")
+def enriched_state(captured_state):
+    return run_node(enrich, captured_state)
+
+@pytest.fixture(scope="class")
+def scored_state(enriched_state):
+    return run_node(score, enriched_state)
+
+@pytest.fixture(scope="class")
+def routed_state(scored_state):
+    return run_node(route, scored_state)
 
 class TestLeadProcessingFlow:
     """Test the complete lead processing workflow."""
     
-    def setup_method(self):
-        """Set up test fixtures."""
-        self.sample_lead = {
-            "email": "john.doe@acme.com",
-            "company": "Acme Corp",
-            "full_name": "John Doe",
-            "title": "Director of Engineering",
-            "source": "website",
-            "country": "US"
-        }
-        
-        self.initial_state = {
-            "raw": self.sample_lead,
-            "errors": [],
-            "notifications": [],
-            "score_reasons": []
-        }
-    
-    def test_capture_node(self):
+    def test_capture_node(self, captured_state):
         """Test the capture node normalizes lead data correctly."""
-        state = self.initial_state.copy()
-        result = capture(state)
+        result = captured_state
         
         assert "normalized" in result
         assert result["normalized"]["email"] == "john.doe@acme.com"
@@ -58,17 +89,16 @@ class TestLeadProcessingFlow:
         }
         
         state = {"raw": incomplete_lead, "errors": [], "notifications": [], "score_reasons": []}
-        result = capture(state)
+        result = run_node(capture, state)
         
         assert len(result["errors"]) > 0
         assert "Missing required fields" in result["errors"][0]
     
-    def test_enrich_node(self):
+    def test_enrich_node(self, captured_state):
         """Test the enrich node adds enrichment data."""
-        state = self.initial_state.copy()
-        state = capture(state)  # First capture
+        state = captured_state
         
-        with patch('tools.clearbit.enrich_domain_person') as mock_enrich:
+        with patch('graph.nodes.enrich.enrich_domain_person_async') as mock_enrich:
             mock_enrich.return_value = {
                 "company": {
                     "domain": "acme.com",
@@ -82,73 +112,79 @@ class TestLeadProcessingFlow:
                 }
             }
             
-            result = enrich(state)
+            result = run_node(enrich, state)
             
             assert "enrichment" in result
             assert result["enrichment"]["company"]["industry"] == "SaaS"
             assert result["enrichment"]["company"]["employees"] == 150
             assert result["enrichment"]["person"]["seniority"] == "director"
     
-    def test_enrich_node_failure(self):
+    def test_enrich_node_failure(self, captured_state):
         """Test enrich node handles API failures gracefully."""
-        state = self.initial_state.copy()
-        state = capture(state)
+        state = captured_state
         
-        with patch('tools.clearbit.enrich_domain_person') as mock_enrich:
+        with patch('graph.nodes.enrich.enrich_domain_person_async') as mock_enrich:
             mock_enrich.side_effect = Exception("API timeout")
             
-            result = enrich(state)
+            result = run_node(enrich, state)
             
             assert "enrichment" in result
             assert result["enrichment"] == {}
             assert len(result["errors"]) > 0
-            assert "enrich_failed" in result["errors"][0]
+            assert "Enrichment failed" in result["errors"][0]
     
-    def test_score_node(self):
+    def test_score_node(self, enriched_state):
         """Test the score node calculates lead scores correctly."""
-        state = self.initial_state.copy()
-        state = capture(state)
-        state = enrich(state)
+        state = enriched_state
         
-        with patch('tools.llm.score_lead_with_rubric') as mock_score:
+        with patch('graph.nodes.score.score_lead_with_rubric_async') as mock_score:
             mock_score.return_value = (0.85, ["ICP match: SaaS", "Seniority: Director"])
             
-            result = score(state)
+            result = run_node(score, state)
             
             assert "score" in result
             assert result["score"] > 0
             assert "score_reasons" in result
             assert len(result["score_reasons"]) > 0
     
-    def test_score_node_rule_based_fallback(self):
+    def test_score_node_rule_based_fallback(self, enriched_state):
         """Test score node falls back to rule-based scoring when LLM fails."""
-        state = self.initial_state.copy()
-        state = capture(state)
-        state = enrich(state)
+        state = enriched_state
         
-        with patch('tools.llm.score_lead_with_rubric') as mock_score:
+        with patch('graph.nodes.score.score_lead_with_rubric_async') as mock_score:
             mock_score.side_effect = Exception("LLM API error")
             
-            result = score(state)
+            result = run_node(score, state)
             
             assert "score" in result
             assert "score_reasons" in result
             assert "Rule-based scoring only" in result["score_reasons"][0]
     
-    def test_route_node(self):
+    def test_rule_score(self):
+        """Test the rule-based score for strong and weak leads."""
+        strong = {
+            "normalized": {"email": "jane@acme.com", "title": "SVP Sales", "country": "us"},
+            "enrichment": {"company": {"employees": 150, "industry": "SaaS", "tech": ["AWS"]}}
+        }
+        weak = {
+            "normalized": {"email": "jane@gmail.com", "title": "Intern", "country": "BR"},
+            "enrichment": {}
+        }
+        
+        assert rule_score(strong) == pytest.approx(1.0)
+        assert rule_score(weak) == 0.0
+    
+    def test_route_node(self, scored_state):
         """Test the route node assigns owners correctly."""
-        state = self.initial_state.copy()
-        state = capture(state)
-        state = enrich(state)
-        state = score(state)
+        state = scored_state
         
-        with patch('tools.hubspot.find_owner_by_rules') as mock_find_owner:
+        with patch('graph.nodes.route.find_owner_by_rules') as mock_find_owner:
             mock_find_owner.return_value = "us-team@company.com"
             
-            with patch('tools.hubspot.create_or_update_contact') as mock_crm:
+            with patch('graph.nodes.route.create_or_update_contact') as mock_crm:
                 mock_crm.return_value = {"id": "12345", "action": "created"}
                 
-                result = route(state)
+                result = run_node(route, state)
                 
                 assert "owner" in result
                 assert result["owner"] == "us-team@company.com"
@@ -156,53 +192,45 @@ class TestLeadProcessingFlow:
                 assert result["crm_record_id"] == "12345"
                 assert "route_reason" in result
     
-    def test_route_node_fallback(self):
+    def test_route_node_fallback(self, scored_state):
         """Test route node falls back to default owner on failure."""
-        state = self.initial_state.copy()
-        state = capture(state)
-        state = enrich(state)
-        state = score(state)
+        state = scored_state
         
-        with patch('tools.hubspot.find_owner_by_rules') as mock_find_owner:
+        with patch('graph.nodes.route.find_owner_by_rules') as mock_find_owner:
             mock_find_owner.side_effect = Exception("Routing error")
             
-            result = route(state)
+            result = run_node(route, state)
             
             assert "owner" in result
             assert "route_reason" in result
             assert "Fallback to default owner" in result["route_reason"]
     
-    def test_summarize_node(self):
+    def test_summarize_node(self, routed_state):
         """Test the summarize node generates summaries and finds similar accounts."""
-        state = self.initial_state.copy()
-        state = capture(state)
-        state = enrich(state)
-        state = score(state)
-        state = route(state)
+        state = routed_state
         
-        with patch('tools.pinecone_store.similar_accounts') as mock_similar:
+        with patch('graph.nodes.similar.similar_accounts') as mock_similar:
             mock_similar.return_value = [
                 {"account": "Acme Inc", "outcome": "Won", "reason": "Same industry"}
             ]
             
-            with patch('tools.llm.summarize_for_ae') as mock_summary:
+            with patch('graph.nodes.summarize.summarize_for_ae_async') as mock_summary:
                 mock_summary.return_value = "Mock summary for AE"
                 
-                result = summarize(state)
+                state = run_node(fetch_similar, state)
+                result = run_node(summarize, state)
                 
                 assert "similar_accounts" in result
                 assert len(result["similar_accounts"]) > 0
                 assert "summary" in result
     
-    def test_nurture_node(self):
+    def test_nurture_node(self, enriched_state):
         """Test the nurture node handles low-scoring leads correctly."""
-        state = self.initial_state.copy()
-        state = capture(state)
-        state = enrich(state)
+        state = dict(enriched_state)
         state["score"] = 0.3  # Low score
-        state = score(state)
+        state = run_node(score, state)
         
-        result = nurture(state)
+        result = run_node(nurture, state)
         
         assert "decided_path" in result
         assert result["decided_path"] == "nurture"
@@ -210,17 +238,17 @@ class TestLeadProcessingFlow:
         assert "nurture_task" in result
         assert "email_sequence" in result
     
-    def test_complete_workflow_high_score(self):
+    def test_complete_workflow_high_score(self, captured_state):
         """Test complete workflow for high-scoring lead."""
-        state = self.initial_state.copy()
+        state = captured_state
         
         # Mock all external dependencies
-        with patch('tools.clearbit.enrich_domain_person') as mock_enrich, \
-             patch('tools.llm.score_lead_with_rubric') as mock_score, \
-             patch('tools.hubspot.find_owner_by_rules') as mock_owner, \
-             patch('tools.hubspot.create_or_update_contact') as mock_crm, \
-             patch('tools.pinecone_store.similar_accounts') as mock_similar, \
-             patch('tools.llm.summarize_for_ae') as mock_summary:
+        with patch('graph.nodes.enrich.enrich_domain_person_async') as mock_enrich, \
+             patch('graph.nodes.score.score_lead_with_rubric_async') as mock_score, \
+             patch('graph.nodes.route.find_owner_by_rules') as mock_owner, \
+             patch('graph.nodes.route.create_or_update_contact') as mock_crm, \
+             patch('graph.nodes.similar.similar_accounts') as mock_similar, \
+             patch('graph.nodes.summarize.summarize_for_ae_async') as mock_summary:
             
             # Setup mocks
             mock_enrich.return_value = {
@@ -233,12 +261,12 @@ class TestLeadProcessingFlow:
             mock_similar.return_value = [{"account": "Test", "outcome": "Won"}]
             mock_summary.return_value = "Summary"
             
-            # Execute workflow
-            state = capture(state)
-            state = enrich(state)
-            state = score(state)
-            state = route(state)
-            state = summarize(state)
+            # Execute workflow from the shared captured state
+            state = run_node(enrich, state)
+            state = run_node(score, state)
+            state = run_node(fetch_similar, state)
+            state = run_node(route, state)
+            state = run_node(summarize, state)
             
             # Verify final state
             assert state["score"] > 0.7
@@ -247,13 +275,13 @@ class TestLeadProcessingFlow:
             assert "summary" in state
             assert len(state["similar_accounts"]) > 0
     
-    def test_complete_workflow_low_score(self):
+    def test_complete_workflow_low_score(self, captured_state):
         """Test complete workflow for low-scoring lead."""
-        state = self.initial_state.copy()
+        state = captured_state
         
         # Mock all external dependencies
-        with patch('tools.clearbit.enrich_domain_person') as mock_enrich, \
-             patch('tools.llm.score_lead_with_rubric') as mock_score:
+        with patch('graph.nodes.enrich.enrich_domain_person_async') as mock_enrich, \
+             patch('graph.nodes.score.score_lead_with_rubric_async') as mock_score:
             
             # Setup mocks for low score
             mock_enrich.return_value = {
@@ -262,40 +290,169 @@ class TestLeadProcessingFlow:
             }
             mock_score.return_value = (0.2, ["Small company", "Non-ICP"])
             
-            # Execute workflow
-            state = capture(state)
-            state = enrich(state)
-            state = score(state)
-            state = nurture(state)
+            # Execute workflow from the shared captured state
+            state = run_node(enrich, state)
+            state = run_node(score, state)
+            state = run_node(nurture, state)
             
             # Verify final state
             assert state["score"] < 0.4
             assert state["decided_path"] == "nurture"
             assert "nurture_data" in state
 
+class TestWorkflowGraph:
+    """Test the compiled LangGraph workflow."""
+    
+    def test_parallel_branches_merge(self):
+        """Test scoring and similar-account lookup both land in the final state."""
+        from app import build_workflow
+        
+        initial_state = {
+            "raw": {
+                "email": "john.doe@acme.com",
+                "company": "Acme Corp",
+                "full_name": "John Doe",
+                "title": "Director of Engineering",
+                "country": "US",
+                "website": "https://acme.com"
+            },
+            "errors": [],
+            "notifications": [],
+            "score_reasons": []
+        }
+        
+        result = asyncio.run(build_workflow().ainvoke(initial_state))
+        
+        assert "score" in result
+        assert len(result["similar_accounts"]) > 0
+        assert "summary" in result
+        assert result["errors"] == []
+    
+    def test_score_future_resolved_without_scoring_update(self, monkeypatch):
+        """Test a ?wait=score caller is released when the graph skips scoring or fails."""
+        import app as app_module
+        
+        class FakeGraph:
+            def __init__(self, error=None):
+                self.error = error
+            
+            async def astream(self, state, stream_mode=None):
+                yield "values", {**state, "score": 0.4}
+                if self.error:
+                    raise self.error
+        
+        monkeypatch.setattr(app_module, "spawn_background", lambda coro: coro.close())
+        
+        async def run(graph):
+            monkeypatch.setattr(app_module, "app_graph", graph)
+            score_future = asyncio.get_running_loop().create_future()
+            try:
+                await app_module.process_lead({}, "key", score_future)
+            except RuntimeError:
+                pass
+            return score_future
+        
+        assert asyncio.run(run(FakeGraph())).result() == {"score": 0.4, "score_reasons": []}
+        with pytest.raises(RuntimeError):
+            asyncio.run(run(FakeGraph(RuntimeError("graph failed")))).result()
+    
+    def test_state_reducers(self):
+        """Test fields shared by parallel branches merge rather than overwrite."""
+        from graph.state import merge_dicts
+        
+        assert REDUCERS["errors"](["a"], ["b"]) == ["a", "b"]
+        assert REDUCERS["notifications"](["slack:1"], ["slack:2"]) == ["slack:1", "slack:2"]
+        assert merge_dicts({"company": {"name": "Acme"}}, {"person": {"email": "a@acme.com"}}) == {
+            "company": {"name": "Acme"},
+            "person": {"email": "a@acme.com"}
+        }
+        assert merge_dicts(None, {"company": {}}) == {"company": {}}
+
+class TestRoutingRules:
+    """Test routing rule loading."""
+    
+    def test_rules_cached_until_file_changes(self, tmp_path, monkeypatch):
+        """Test the routing file is only re-read when its mtime changes."""
+        import graph.nodes.route as route_module
+        
+        path = tmp_path / "routing.json"
+        path.write_text(json.dumps({"US": "us@company.com", "DEFAULT": "general@company.com"}))
+        monkeypatch.setattr(route_module, "ROUTING_CONFIG_PATH", str(path))
+        monkeypatch.setattr(route_module, "_ROUTES_CACHE", {"mtime": None, "data": None})
+        
+        first = load_routing_rules()
+        assert load_routing_rules() is first
+        
+        path.write_text(json.dumps({"US": "new-us@company.com", "DEFAULT": "general@company.com"}))
+        os.utime(path, (0, os.stat(path).st_mtime + 10))
+        
+        assert load_routing_rules()["US"] == "new-us@company.com"
+    
+    def test_invalid_json_keeps_last_good_rules(self, tmp_path, monkeypatch):
+        """Test a broken routing file does not discard previously loaded rules."""
+        import graph.nodes.route as route_module
+        
+        path = tmp_path / "routing.json"
+        path.write_text(json.dumps({"US": "us@company.com"}))
+        monkeypatch.setattr(route_module, "ROUTING_CONFIG_PATH", str(path))
+        monkeypatch.setattr(route_module, "_ROUTES_CACHE", {"mtime": None, "data": None})
+        load_routing_rules()
+        
+        path.write_text("{not json")
+        os.utime(path, (0, os.stat(path).st_mtime + 10))
+        
+        assert load_routing_rules() == {"US": "us@company.com"}
+    
+    def test_owner_lookup_uses_normalized_rules(self, tmp_path, monkeypatch):
+        """Test lowercase territory keys match and industry routing is the fallback."""
+        import graph.nodes.route as route_module
+        import tools.hubspot as hubspot_module
+        
+        path = tmp_path / "routing.json"
+        path.write_text(json.dumps({"us": "us@company.com", "DEFAULT": "general@company.com"}))
+        monkeypatch.setattr(route_module, "ROUTING_CONFIG_PATH", str(path))
+        monkeypatch.setattr(route_module, "_ROUTES_CACHE", {"mtime": None, "data": None})
+        monkeypatch.setattr(hubspot_module.hubspot_client, "api_key", "test-key")
+        
+        async def no_contact(email):
+            return None
+        
+        monkeypatch.setattr(hubspot_module.hubspot_client, "_existing_owner_id", no_contact)
+        routes = load_routing_rules()
+        
+        async def run():
+            return await asyncio.gather(
+                hubspot_module.find_owner_by_rules({"country": "us"}, {}, routes),
+                hubspot_module.find_owner_by_rules({"country": "FR"}, {"company": {"industry": "FinTech"}}, routes),
+                hubspot_module.find_owner_by_rules({"country": "FR"}, {}, routes)
+            )
+        
+        assert asyncio.run(run()) == ["us@company.com", "fintech-team@company.com", "general@company.com"]
+
 class TestIdempotency:
     """Test the idempotency functionality."""
     
     def test_idempotency_check_and_set(self):
         """Test that duplicate keys are properly detected."""
-        idem = Idem()
+        async def run():
+            idem = Idem()
+            
+            # First call should succeed, second call with same key should fail
+            return await idem.check_and_set("test_key_1"), await idem.check_and_set("test_key_1")
         
-        # First call should succeed
-        result1 = idem.check_and_set("test_key_1")
+        result1, result2 = asyncio.run(run())
         assert result1 is True
-        
-        # Second call with same key should fail
-        result2 = idem.check_and_set("test_key_1")
         assert result2 is False
     
     def test_idempotency_different_keys(self):
         """Test that different keys are processed independently."""
-        idem = Idem()
-        
-        # Different keys should both succeed
-        result1 = idem.check_and_set("key_1")
-        result2 = idem.check_and_set("key_2")
+        async def run():
+            idem = Idem()
+            
+            # Different keys should both succeed
+            return await idem.check_and_set("key_1"), await idem.check_and_set("key_2")
         
+        result1, result2 = asyncio.run(run())
         assert result1 is True
         assert result2 is True
     
@@ -303,8 +460,901 @@ class TestIdempotency:
         """Test handling of empty keys."""
         idem = Idem()
         
-        result = idem.check_and_set("")
+        result = asyncio.run(idem.check_and_set(""))
         assert result is False
+    
+    def test_idempotency_fingerprint(self):
+        """Test the payload fingerprint is stored and is key-order independent."""
+        fingerprint = payload_fingerprint({"email": "a@acme.com", "company": "Acme"})
+        assert fingerprint == payload_fingerprint({"company": "Acme", "email": "a@acme.com"})
+        assert fingerprint != payload_fingerprint({"email": "a@acme.com", "company": "Other"})
+        
+        async def run():
+            idem = Idem(backend="memory")
+            await idem.check_and_set("fp_key", fingerprint=fingerprint)
+            return await idem.get_fingerprint("fp_key")
+        
+        assert asyncio.run(run()) == fingerprint
+    
+    def test_processing_time_from_ttl(self):
+        """Test processing time is derived from the key's remaining TTL."""
+        async def run():
+            idem = Idem(backend="memory")
+            await idem.check_and_set("timed", ttl=600)
+            return await idem.get_processing_time("timed", ttl=600), await idem.get_processing_time("missing")
+        
+        before = int(time.time())
+        processed_at, missing = asyncio.run(run())
+        
+        assert before - 1 <= processed_at <= int(time.time())
+        assert missing == 0
+    
+    def test_idempotency_key_fallback(self):
+        """Test anonymous payloads are keyed by content, not arrival time."""
+        first = {"company": "Acme", "full_name": "Jane Doe"}
+        second = {"company": "Beta", "full_name": "John Roe"}
+        
+        assert idempotency_key({"event_id": "evt_1", "email": "a@b.com"}) == "evt_1"
+        assert idempotency_key({"email": "a@b.com"}) == "a@b.com"
+        assert idempotency_key(first) == idempotency_key(dict(reversed(list(first.items()))))
+        assert idempotency_key(first) != idempotency_key(second)
+        assert len(idempotency_key(first)) == 32
+    
+    def test_check_and_set_many(self):
+        """Test batched checks report new and duplicate keys in order."""
+        async def run():
+            idem = Idem(backend="memory")
+            await idem.check_and_set("seen")
+            return await idem.check_and_set_many(["new", "seen", "new"])
+        
+        assert asyncio.run(run()) == [True, False, False]
+    
+    def test_concurrent_checks_share_one_pipeline(self):
+        """Test concurrent Redis checks are sent as a single pipeline."""
+        executed = []
+        
+        class FakePipeline:
+            def __init__(self, store):
+                self.store = store
+                self.commands = []
+            
+            def set(self, name, value, ex=None, nx=False):
+                self.commands.append(name)
+            
+            async def execute(self):
+                executed.append(list(self.commands))
+                results = []
+                for name in self.commands:
+                    results.append(name not in self.store or None)
+                    self.store.add(name)
+                return results
+        
+        class FakeRedis:
+            def __init__(self):
+                self.store = {"idem:dup"}
+            
+            def pipeline(self, transaction=True):
+                return FakePipeline(self.store)
+        
+        async def run():
+            idem = Idem(backend="memory")
+            idem._connected = True
+            idem.r = FakeRedis()
+            return await asyncio.gather(*[idem.check_and_set(key) for key in ["a", "dup", "b"]])
+        
+        assert asyncio.run(run()) == [True, False, True]
+        assert executed == [["idem:a", "idem:dup", "idem:b"]]
+    
+    def test_memory_fallback_expires_and_is_bounded(self, monkeypatch):
+        """Test the in-memory store honours TTLs and evicts past its cap."""
+        import tools.idempotency as idem_module
+        
+        now = [1000.0]
+        
+        class FakeTime:
+            time = staticmethod(lambda: now[0])
+            monotonic = staticmethod(lambda: now[0])
+        
+        # Patch the module's clock only; the event loop keeps the real one
+        monkeypatch.setattr(idem_module, "time", FakeTime)
+        monkeypatch.setattr(idem_module, "IDEM_MEMORY_MAXSIZE", 2)
+        
+        async def run():
+            idem = Idem(backend="memory")
+            results = [await idem.check_and_set("a", ttl=10), await idem.check_and_set("a", ttl=10)]
+            now[0] += 11
+            results.append(await idem.check_and_set("a", ttl=10))
+            await idem.check_and_set("b", ttl=100)
+            await idem.check_and_set("c", ttl=100)
+            return results, list(idem._memory_keys)
+        
+        results, keys = asyncio.run(run())
+        
+        assert results == [True, False, True]
+        assert keys == ["b", "c"]
+
+class TestAsyncBatcher:
+    """Test the dynamic batching helper."""
+    
+    def test_concurrent_calls_share_one_batch(self):
+        """Test concurrent submissions are coalesced into a single batch call."""
+        calls = []
+        
+        async def double(items):
+            calls.append(list(items))
+            return [item * 2 for item in items]
+        
+        async def run():
+            batcher = AsyncBatcher(double, max_batch_size=8, max_delay=0.01)
+            return await asyncio.gather(*[batcher.process_batched(i) for i in range(5)])
+        
+        results = asyncio.run(run())
+        
+        assert results == [0, 2, 4, 6, 8]
+        assert calls == [[0, 1, 2, 3, 4]]
+    
+    def test_full_batch_flushes_immediately(self):
+        """Test a batch is dispatched as soon as max_batch_size is reached."""
+        calls = []
+        
+        async def echo(items):
+            calls.append(list(items))
+            return items
+        
+        async def run():
+            batcher = AsyncBatcher(echo, max_batch_size=2, max_delay=10)
+            return await asyncio.wait_for(
+                asyncio.gather(*[batcher.process_batched(i) for i in range(4)]),
+                timeout=1
+            )
+        
+        assert asyncio.run(run()) == [0, 1, 2, 3]
+        assert calls == [[0, 1], [2, 3]]
+    
+    def test_per_item_exceptions(self):
+        """Test an exception result is raised only to its own caller."""
+        async def check(items):
+            return [ValueError("bad") if item < 0 else item for item in items]
+        
+        async def run():
+            batcher = AsyncBatcher(check, max_batch_size=8, max_delay=0.01)
+            return await asyncio.gather(
+                batcher.process_batched(1),
+                batcher.process_batched(-1),
+                return_exceptions=True
+            )
+        
+        ok, failed = asyncio.run(run())
+        
+        assert ok == 1
+        assert isinstance(failed, ValueError)
+
+class TestRunBlocking:
+    """Test blocking vendor calls are bounded per vendor."""
+    
+    def test_vendor_concurrency_is_bounded(self, monkeypatch):
+        """Test no more than the vendor's limit run in threads at once."""
+        import threading
+        import time as time_module
+        
+        monkeypatch.setitem(sys.modules["tools.threads"].VENDOR_CONCURRENCY, "test_vendor", 2)
+        lock = threading.Lock()
+        active = [0]
+        peak = [0]
+        
+        def blocking_call(value):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time_module.sleep(0.02)
+            with lock:
+                active[0] -= 1
+            return value
+        
+        async def run():
+            return await asyncio.gather(*[run_blocking("test_vendor", blocking_call, i) for i in range(6)])
+        
+        assert asyncio.run(run()) == list(range(6))
+        assert peak[0] == 2
+
+class TestAdaptiveLimiter:
+    """Test the vendor rate limiter backs off on 429s."""
+    
+    def test_rate_limited_call_is_retried_at_half_rate(self):
+        """Test a 429 halves the rate, honours Retry-After and retries once."""
+        from tools.ratelimit import AdaptiveLimiter, RateLimited, retry_after_seconds
+        
+        limiter = AdaptiveLimiter("test", max_rate=600)
+        attempts = []
+        
+        async def flaky():
+            attempts.append(len(attempts))
+            if len(attempts) == 1:
+                raise RateLimited(retry_after_seconds({"retry-after": "0.01"}))
+            return "ok"
+        
+        assert asyncio.run(limiter.call(flaky)) == "ok"
+        assert attempts == [0, 1]
+        assert limiter.rate == 300
+        assert retry_after_seconds({"retry-after": "soon"}, default=2.0) == 2.0
+    
+    def test_burst_is_not_delayed(self):
+        """Test calls within the burst allowance start without waiting."""
+        import time as time_module
+        from tools.ratelimit import AdaptiveLimiter
+        
+        limiter = AdaptiveLimiter("test", max_rate=600)
+        
+        async def run():
+            start = time_module.monotonic()
+            for _ in range(int(limiter.burst)):
+                await limiter.acquire()
+            return time_module.monotonic() - start
+        
+        assert asyncio.run(run()) < 0.05
+
+class FakeStream:
+    """Async iterator standing in for an OpenAI chat completion stream."""
+    
+    def __init__(self, deltas):
+        self.deltas = list(deltas)
+        self.sent = 0
+        self.closed = False
+    
+    def __aiter__(self):
+        return self
+    
+    async def __anext__(self):
+        from types import SimpleNamespace
+        if self.sent == len(self.deltas):
+            raise StopAsyncIteration
+        self.sent += 1
+        return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=self.deltas[self.sent - 1]))])
+    
+    async def close(self):
+        self.closed = True
+
+class TestLLMClient:
+    """Test the OpenAI client wiring."""
+    
+    def test_sync_wrapper_matches_async(self):
+        """Test the synchronous scorer delegates to the async path (mock mode)."""
+        from tools.llm import llm_client
+        
+        state = {"normalized": {"title": "VP Sales"}, "enrichment": {"company": {"industry": "SaaS", "employees": 150}}}
+        
+        assert llm_client.score_lead_with_rubric(state, 0.2) == asyncio.run(llm_client.score_lead_with_rubric_async(state, 0.2))
+    
+    def test_async_client_follows_event_loop(self, monkeypatch):
+        """Test the AsyncOpenAI client is reused within a loop and rebuilt for a new one."""
+        from tools.llm import LLMClient
+        
+        monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+        client = LLMClient()
+        
+        async def run():
+            return client._get_async_client(), client._get_async_client()
+        
+        first, again = asyncio.run(run())
+        second, _ = asyncio.run(run())
+        
+        assert first is again
+        assert second is not first
+    
+    def test_async_client_per_live_loop(self, monkeypatch):
+        """Test interleaved calls from two running loops each keep their own client."""
+        from tools.llm import LLMClient
+        from tools.threads import run_sync
+        
+        monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+        client = LLMClient()
+        
+        async def get_client():
+            return client._get_async_client()
+        
+        async def run():
+            seen = []
+            for _ in range(2):
+                seen.append((await get_client(), run_sync(get_client())))
+            return seen
+        
+        (main_first, background_first), (main_second, background_second) = asyncio.run(run())
+        
+        assert main_first is main_second
+        assert background_first is background_second
+        assert main_first is not background_first
+    
+    def test_batch_scoring_uses_one_call(self, monkeypatch):
+        """Test numbered leads share one completion and unparsed leads are re-scored."""
+        from types import SimpleNamespace
+        from tools.llm import LLMClient
+        
+        monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+        client = LLMClient()
+        prompts = []
+        
+        async def create(**kwargs):
+            prompts.append(kwargs["messages"][1]["content"])
+            # Out of order, and lead 2 is missing
+            content = '[{"id": 3, "score": 0.2, "reasons": ["Small"]}, {"id": 1, "score": 0.9, "reasons": ["ICP"]}]'
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+        
+        async def score_one(state, base_hint):
+            return base_hint, ["individual"]
+        
+        fake = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+        monkeypatch.setattr(client, "_get_async_client", lambda: fake)
+        monkeypatch.setattr(client, "score_lead_with_rubric_async", score_one)
+        
+        states = [{"normalized": {"email": f"lead{i}@acme.com"}} for i in range(3)]
+        results = asyncio.run(client.score_leads_batch(states, [0.1, 0.5, 0.3]))
+        
+        assert results == [(0.9, ["ICP"]), (0.5, ["individual"]), (0.2, ["Small"])]
+        assert len(prompts) == 1
+        assert "[1] LEAD DATA" in prompts[0] and "[3] LEAD DATA" in prompts[0]
+    
+    def test_repeat_prompt_served_from_cache(self, monkeypatch):
+        """Test an identical scoring prompt skips OpenAI the second time."""
+        from types import SimpleNamespace
+        import tools.llm as llm_module
+        
+        monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+        monkeypatch.setattr(llm_module, "llm_cache", RedisCache("test_llm", ttl=60, local_maxsize=10))
+        llm_module.llm_cache.r = None  # no Redis: only the local tier is available
+        client = llm_module.LLMClient()
+        calls = []
+        
+        async def create(**kwargs):
+            calls.append(kwargs)
+            return FakeStream(['{"score": 0.8, ', '"reasons": ["ICP match: SaaS"]}'])
+        
+        fake = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+        monkeypatch.setattr(client, "_get_async_client", lambda: fake)
+        state = {"normalized": {"email": "cached@acme.com"}}
+        
+        async def run():
+            return await client.score_lead_with_rubric_async(state, 0.5), await client.score_lead_with_rubric_async(state, 0.5)
+        
+        assert asyncio.run(run()) == ((0.8, ["ICP match: SaaS"]), (0.8, ["ICP match: SaaS"]))
+        assert len(calls) == 1
+    
+    def test_sync_wrapper_uses_connected_cache(self, monkeypatch):
+        """Test the run_sync loop gets its own Redis client instead of the server loop's."""
+        from types import SimpleNamespace
+        import tools.llm as llm_module
+        
+        store = {}
+        
+        class FakeRedis:
+            """Shares one store, but like redis.asyncio only works on its first loop."""
+            
+            def __init__(self):
+                self.loop = None
+            
+            def _check_loop(self):
+                self.loop = self.loop or asyncio.get_running_loop()
+                if self.loop is not asyncio.get_running_loop():
+                    raise RuntimeError("attached to a different loop")
+            
+            async def ping(self):
+                self._check_loop()
+            
+            async def get(self, name):
+                self._check_loop()
+                return store.get(name)
+            
+            async def set(self, name, value, ex=None):
+                self._check_loop()
+                store[name] = value
+        
+        monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+        monkeypatch.setattr(RedisCache, "_create_client", lambda self: FakeRedis())
+        monkeypatch.setattr(llm_module, "llm_cache", RedisCache("test_loops", ttl=60))
+        client = llm_module.LLMClient()
+        calls = []
+        
+        async def create(**kwargs):
+            calls.append(kwargs)
+            return FakeStream(['{"score": 0.8, "reasons": ["ICP"]}'])
+        
+        fake = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+        monkeypatch.setattr(client, "_get_async_client", lambda: fake)
+        first = {"normalized": {"email": "first@acme.com"}}
+        second = {"normalized": {"email": "second@acme.com"}}
+        
+        async def run():
+            await llm_module.llm_cache.connect()
+            await client.score_lead_with_rubric_async(first, 0.5)
+            # The sync wrapper runs on the background loop while this loop is live
+            from_sync = client.score_lead_with_rubric(first, 0.5), client.score_lead_with_rubric(second, 0.5)
+            return from_sync, await client.score_lead_with_rubric_async(second, 0.5)
+        
+        (first_sync, second_sync), second_async = asyncio.run(run())
+        
+        assert first_sync == second_sync == second_async == (0.8, ["ICP"])
+        assert len(calls) == 2
+        assert len(store) == 2
+    
+    def test_stream_stops_at_end_of_json(self):
+        """Test the scoring stream is closed once its JSON object completes."""
+        from tools.llm import _read_json_object
+        
+        stream = FakeStream(['Here you go: {"score": 0.7, "reasons": ["a {b}", ', '"c \\" }"]}', ' Let me explain', ' why...'])
+        
+        content = asyncio.run(_read_json_object(stream))
+        
+        assert json.loads(content[content.index("{"):]) == {"score": 0.7, "reasons": ["a {b}", 'c " }']}
+        assert stream.sent == 2 and stream.closed
+    
+    def test_offline_batch_mode_uses_batch_api(self, monkeypatch):
+        """Test large offline jobs go through the Batch API and map results by custom_id."""
+        from types import SimpleNamespace
+        import tools.llm as llm_module
+        
+        monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+        monkeypatch.setattr(llm_module, "OPENAI_BATCH_MIN_LEADS", 2)
+        monkeypatch.setattr(llm_module, "OPENAI_BATCH_POLL_INTERVAL", 0)
+        monkeypatch.setattr(llm_module, "llm_cache", RedisCache("test_batch", ttl=0))
+        client = llm_module.LLMClient()
+        uploaded = []
+        statuses = iter(["in_progress", "completed"])
+        
+        async def create_file(file, purpose):
+            uploaded.append([json.loads(line)["custom_id"] for line in file[1].splitlines()])
+            return SimpleNamespace(id="file_in")
+        
+        async def create_batch(**kwargs):
+            return SimpleNamespace(id="batch_1", status="validating", output_file_id=None)
+        
+        async def retrieve(batch_id):
+            status = next(statuses)
+            return SimpleNamespace(id=batch_id, status=status, output_file_id="file_out" if status == "completed" else None)
+        
+        async def content(file_id):
+            # Lead 0 failed; lead 1 succeeded
+            lines = [
+                {"custom_id": "1", "response": {"body": {"choices": [{"message": {"content": '{"score": 0.9, "reasons": ["ICP"]}'}}]}}},
+                {"custom_id": "0", "response": None, "error": {"code": "server_error"}},
+            ]
+            return SimpleNamespace(content="\n".join(json.dumps(line) for line in lines).encode())
+        
+        fake = SimpleNamespace(
+            files=SimpleNamespace(create=create_file, content=content),
+            batches=SimpleNamespace(create=create_batch, retrieve=retrieve)
+        )
+        monkeypatch.setattr(client, "_get_async_client", lambda: fake)
+        states = [{"normalized": {"title": "Intern"}}, {"normalized": {"title": "VP"}}]
+        
+        results = asyncio.run(client.score_leads_batch(states, [0.3, 0.5], batch_mode=True))
+        
+        assert uploaded == [["0", "1"]]
+        assert results == [(0.3, ["Basic qualification met"]), (0.9, ["ICP"])]
+    
+    def test_concurrent_embeddings_share_one_request(self, monkeypatch):
+        """Test concurrent lead embeddings are sent as one embeddings request."""
+        from types import SimpleNamespace
+        import tools.llm as llm_module
+        
+        requests_sent = []
+        
+        async def create(model, input):
+            requests_sent.append(list(input))
+            # The API may return items out of order; index identifies the input
+            data = [SimpleNamespace(index=i, embedding=[float(len(text))]) for i, text in enumerate(input)]
+            return SimpleNamespace(data=list(reversed(data)))
+        
+        fake = SimpleNamespace(embeddings=SimpleNamespace(create=create))
+        monkeypatch.setattr(llm_module.llm_client, "api_key", "test-key")
+        monkeypatch.setattr(llm_module.llm_client, "_get_async_client", lambda: fake)
+        monkeypatch.setattr(llm_module, "embedding_batcher", AsyncBatcher(llm_module.embed_texts, max_batch_size=10, max_delay=0.01))
+        
+        async def run():
+            return await asyncio.gather(*[llm_module.embed_text_async(text) for text in ["a", "bb", "ccc"]])
+        
+        assert asyncio.run(run()) == [[1.0], [2.0], [3.0]]
+        assert requests_sent == [["a", "bb", "ccc"]]
+
+class TestPineconeQuery:
+    """Test similar-account queries against Pinecone."""
+    
+    def test_filtered_query_widens_when_empty(self, monkeypatch):
+        """Test the industry/country filter is sent, and dropped if nothing matches."""
+        from types import SimpleNamespace
+        import tools.pinecone_store as pinecone_module
+        from tools.pinecone_store import pinecone_store
+        
+        queries = []
+        
+        class FakeIndex:
+            def query(self, **kwargs):
+                queries.append(kwargs.get("filter"))
+                matches = [] if kwargs.get("filter") else [
+                    SimpleNamespace(score=0.9, metadata={"company_name": "Acme", "outcome": "Won"})
+                ]
+                return SimpleNamespace(matches=matches)
+        
+        monkeypatch.setattr(pinecone_store, "index", FakeIndex())
+        state = {"enrichment": {"company": {"industry": "SaaS"}}, "normalized": {"country": "us"}}
+        
+        result = pinecone_store.similar_accounts(state, vector=[0.0])
+        
+        assert queries == [{"industry_key": {"$eq": "saas"}, "country": {"$eq": "US"}}, None]
+        assert result[0]["account"] == "Acme"
+        
+        # Country alone is too little signal to query at all
+        assert pinecone_store.similar_accounts({"normalized": {"country": "US"}}, vector=[0.0]) == []
+        assert len(queries) == 2
+        
+        # With an OpenAI key, a missing embedding never falls back to the stub
+        monkeypatch.setattr(pinecone_module.llm_client, "api_key", "test-key")
+        assert pinecone_store.similar_accounts(state) == []
+        assert len(queries) == 2
+    
+    def test_null_company_fields(self, monkeypatch):
+        """Test Clearbit nulls are read as missing features rather than raising."""
+        import tools.pinecone_store as pinecone_module
+        
+        upserts = []
+        
+        class FakeIndex:
+            def upsert(self, vectors):
+                upserts.extend(metadata for _, _, metadata in vectors)
+        
+        monkeypatch.setattr(pinecone_module.pinecone_store, "index", FakeIndex())
+        company = {"name": "Sparse", "industry": None, "employees": None, "tech": None, "country": None}
+        state = {"enrichment": {"company": company}, "normalized": {"country": "US"}}
+        
+        assert asyncio.run(pinecone_module.embed_account_features(state)) is None
+        assert pinecone_module.similar_accounts(state) == []
+        assert pinecone_module.store_account_outcomes([(company, "Lost", None)]) == 1
+        assert upserts[0]["industry"] == "" and upserts[0]["employees"] == 0
+    
+    def test_bulk_outcomes_upsert_in_batches(self, monkeypatch):
+        """Test backfilled outcomes are upserted in fixed-size batches."""
+        import tools.pinecone_store as pinecone_module
+        
+        upserts = []
+        
+        class FakeIndex:
+            def upsert(self, vectors):
+                upserts.append([metadata["company_name"] for _, _, metadata in vectors])
+        
+        monkeypatch.setattr(pinecone_module.pinecone_store, "index", FakeIndex())
+        monkeypatch.setattr(pinecone_module, "PINECONE_UPSERT_BATCH_SIZE", 2)
+        records = [({"name": f"Co{i}", "industry": "SaaS", "country": "us"}, "Won", None) for i in range(5)]
+        
+        assert pinecone_module.store_account_outcomes(records) == 5
+        
+        assert upserts == [["Co0", "Co1"], ["Co2", "Co3"], ["Co4"]]
+    
+    def test_bulk_outcomes_skip_failed_embeddings(self, monkeypatch):
+        """Test a failed embedding chunk is skipped, never stored with stub vectors."""
+        import tools.pinecone_store as pinecone_module
+        
+        upserts = []
+        
+        class FakeIndex:
+            def upsert(self, vectors):
+                upserts.extend((metadata["company_name"], len(values)) for _, values, metadata in vectors)
+        
+        async def fake_embed(texts):
+            if any("fintech" in text for text in texts):
+                raise RuntimeError("OpenAI unavailable")
+            return [[0.5, 0.5] for _ in texts]
+        
+        monkeypatch.setattr(pinecone_module.pinecone_store, "index", FakeIndex())
+        monkeypatch.setattr(pinecone_module.llm_client, "api_key", "test-key")
+        monkeypatch.setattr(pinecone_module, "embed_texts", fake_embed)
+        monkeypatch.setattr(pinecone_module, "EMBEDDING_BATCH_SIZE", 2)
+        records = [
+            ({"name": "Co0", "industry": "SaaS"}, "Won", None),
+            ({"name": "Co1", "industry": "SaaS"}, "Won", None),
+            ({"name": "Co2", "industry": "Fintech"}, "Lost", None),
+            ({"name": "Co3", "industry": "SaaS"}, "Won", None)
+        ]
+        
+        assert pinecone_module.store_account_outcomes(records) == 2
+        assert upserts == [("Co0", 2), ("Co1", 2)]
+
+class TestClearbitEnrichment:
+    """Test the Clearbit enrichment wrappers."""
+    
+    def test_company_and_person_run_concurrently(self, monkeypatch):
+        """Test both lookups are in flight at the same time."""
+        import tools.clearbit as clearbit_module
+        
+        active = []
+        peak = []
+        
+        async def fake_lookup(value):
+            active.append(value)
+            peak.append(len(active))
+            await asyncio.sleep(0.01)
+            active.remove(value)
+            return {"company": {"domain": value}} if "@" not in value else {"person": {"email": value}}
+        
+        monkeypatch.setattr(clearbit_module.enricher, "enrich_company", fake_lookup)
+        monkeypatch.setattr(clearbit_module.enricher, "enrich_person", fake_lookup)
+        
+        result = asyncio.run(clearbit_module.enrich_domain_person_async("acme.com", "a@acme.com"))
+        
+        assert max(peak) == 2
+        assert result["company"] == {"domain": "acme.com"}
+        assert result["person"] == {"email": "a@acme.com"}
+    
+    def test_sync_wrapper_reuses_background_loop(self):
+        """Test the synchronous wrapper runs on one persistent loop."""
+        import tools.clearbit as clearbit_module
+        import tools.threads as threads_module
+        
+        first = clearbit_module.enrich_domain_person(domain="acme.com")
+        loop = threads_module._background_loop
+        second = clearbit_module.enrich_domain_person(email="a@acme.com")
+        
+        assert first["company"]["domain"] == "acme.com"
+        assert second["person"]["email"] == "a@acme.com"
+        assert threads_module._background_loop is loop and loop.is_running()
+
+class TestEnrichmentCache:
+    """Test Clearbit responses are served from the cache."""
+    
+    def test_cache_hit_skips_api_call(self, monkeypatch):
+        """Test a cached company is returned without an HTTP request."""
+        import tools.clearbit as clearbit_module
+        
+        cached_company = {"company": {"domain": "example.com", "name": "Cached Co"}}
+        lookups = []
+        
+        async def fake_get(key):
+            lookups.append(key)
+            return cached_company
+        
+        def fail_client(vendor):
+            raise AssertionError("HTTP client should not be used on a cache hit")
+        
+        monkeypatch.setattr(clearbit_module.enricher, "api_key", "test-key")
+        monkeypatch.setattr(clearbit_module.enrichment_cache, "get", fake_get)
+        monkeypatch.setattr(clearbit_module, "get_http_client", fail_client)
+        
+        result = asyncio.run(clearbit_module.enricher.enrich_company("Example.com"))
+        
+        assert result == cached_company
+        assert lookups == ["company:example.com"]
+    
+    def test_local_tier_serves_repeat_keys(self):
+        """Test values set in the cache are served in process, as copies."""
+        async def run():
+            cache = RedisCache("test", ttl=60, local_maxsize=10)
+            cache.r = None  # no Redis: only the local tier is available
+            await cache.set("company:acme.com", {"company": {"name": "Acme"}})
+            first = await cache.get("company:acme.com")
+            first["company"]["name"] = "Mutated"
+            return await cache.get("company:acme.com"), await cache.get("company:other.com")
+        
+        hit, miss = asyncio.run(run())
+        
+        assert hit == {"company": {"name": "Acme"}}
+        assert miss is None
+    
+    def test_local_ttl_cache_evicts_and_expires(self, monkeypatch):
+        """Test least recently used entries are evicted and old ones expire."""
+        import tools.cache as cache_module
+        
+        now = [1000.0]
+        monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+        cache = cache_module.LocalTTLCache(maxsize=2, ttl=10)
+        
+        cache.set("a", b"1")
+        cache.set("b", b"2")
+        cache.get("a")
+        cache.set("c", b"3")
+        
+        assert cache.get("b") is None
+        assert cache.get("a") == b"1"
+        
+        now[0] += 11
+        assert cache.get("a") is None
+
+class TestHubSpotBatching:
+    """Test HubSpot contact calls are coalesced into batch endpoints."""
+    
+    def test_concurrent_upserts_share_one_call(self, monkeypatch):
+        """Test each lead gets its own record id from a single batch request."""
+        import tools.hubspot as hubspot_module
+        
+        requests_sent = []
+        
+        class FakeResponse:
+            def __init__(self, inputs):
+                self.inputs = inputs
+            
+            def raise_for_status(self):
+                pass
+            
+            @property
+            def content(self):
+                return json.dumps({"results": [
+                    {"id": f"id_{item['id']}", "properties": {"email": item["id"]}, "new": item["id"].startswith("new")}
+                    for item in self.inputs
+                ]}).encode()
+        
+        class FakeClient:
+            async def post(self, url, content=None):
+                requests_sent.append(url)
+                return FakeResponse(json.loads(content)["inputs"])
+        
+        monkeypatch.setattr(hubspot_module.hubspot_client, "api_key", "test-key")
+        monkeypatch.setattr(hubspot_module, "get_http_client", lambda vendor: FakeClient())
+        monkeypatch.setattr(
+            hubspot_module,
+            "contact_batcher",
+            AsyncBatcher(hubspot_module.hubspot_client.upsert_contacts, max_batch_size=100, max_delay=0.01)
+        )
+        states = [
+            {"normalized": {"email": "new@a.com", "full_name": "New Lead"}},
+            {"normalized": {"email": "old@b.com", "full_name": "Old Lead"}},
+            {"normalized": {"full_name": "No Email"}},
+        ]
+        
+        async def run():
+            return await asyncio.gather(*[hubspot_module.create_or_update_contact(s) for s in states])
+        
+        results = asyncio.run(run())
+        
+        assert results == [
+            {"id": "id_new@a.com", "action": "created"},
+            {"id": "id_old@b.com", "action": "updated"},
+            None,
+        ]
+        assert requests_sent == ["/crm/v3/objects/contacts/batch/upsert"]
+    
+    def test_rejected_upsert_batch_is_bisected(self, monkeypatch):
+        """Test a 4xx batch is split so only the invalid contact fails."""
+        import httpx
+        import tools.hubspot as hubspot_module
+        
+        batch_sizes = []
+        
+        class FakeClient:
+            async def post(self, url, content=None):
+                inputs = json.loads(content)["inputs"]
+                batch_sizes.append(len(inputs))
+                request = httpx.Request("POST", url)
+                if any(item["properties"]["country"] == "Atlantis" for item in inputs):
+                    return httpx.Response(400, json={"message": "Invalid country"}, request=request)
+                return httpx.Response(200, json={"results": [
+                    {"id": f"id_{item['id']}", "properties": {"email": item["id"]}} for item in inputs
+                ]}, request=request)
+        
+        monkeypatch.setattr(hubspot_module, "get_http_client", lambda vendor: FakeClient())
+        properties = [{"email": f"lead{i}@a.com", "country": "Atlantis" if i == 2 else "US"} for i in range(4)]
+        
+        results = asyncio.run(hubspot_module.hubspot_client.upsert_contacts(properties))
+        
+        assert [result["id"] for i, result in enumerate(results) if i != 2] == ["id_lead0@a.com", "id_lead1@a.com", "id_lead3@a.com"]
+        assert isinstance(results[2], httpx.HTTPStatusError)
+        assert batch_sizes == [4, 2, 2, 1, 1]
+    
+    def test_concurrent_owner_lookups_share_one_read(self, monkeypatch):
+        """Test contact lookups are coalesced into a single batch read."""
+        import tools.hubspot as hubspot_module
+        
+        requests_sent = []
+        
+        class FakeResponse:
+            def raise_for_status(self):
+                pass
+            
+            content = json.dumps({"results": [
+                {"id": "1", "properties": {"email": "known@a.com", "hubspot_owner_id": "owner_1"}}
+            ]}).encode()
+        
+        class FakeClient:
+            async def post(self, url, content=None):
+                requests_sent.append((url, [item["id"] for item in json.loads(content)["inputs"]]))
+                return FakeResponse()
+        
+        monkeypatch.setattr(hubspot_module.hubspot_client, "api_key", "test-key")
+        monkeypatch.setattr(hubspot_module, "get_http_client", lambda vendor: FakeClient())
+        monkeypatch.setattr(
+            hubspot_module,
+            "contact_reader",
+            AsyncBatcher(hubspot_module.hubspot_client.read_contacts_by_email, max_batch_size=100, max_delay=0.01)
+        )
+        local_cache = RedisCache("owner_cache", ttl=60, local_maxsize=10)
+        local_cache.r = None
+        monkeypatch.setattr(hubspot_module, "owner_cache", local_cache)
+        routes = {"US": "us-team@company.com", "DEFAULT": "general@company.com"}
+        
+        async def run():
+            return await asyncio.gather(
+                hubspot_module.find_owner_by_rules({"email": "Known@a.com", "country": "CA"}, {}, routes),
+                hubspot_module.find_owner_by_rules({"email": "new@b.com", "country": "US"}, {}, routes)
+            )
+        
+        assert asyncio.run(run()) == ["owner_1", "us-team@company.com"]
+        assert len(requests_sent) == 1
+        assert requests_sent[0][0] == "/crm/v3/objects/contacts/batch/read"
+        assert sorted(requests_sent[0][1]) == ["known@a.com", "new@b.com"]
+        
+        # Known and unknown emails are now cached, so repeats skip HubSpot
+        assert asyncio.run(run()) == ["owner_1", "us-team@company.com"]
+        assert len(requests_sent) == 1
+
+class TestSlackDispatch:
+    """Test Slack notification dispatch (mock mode)."""
+    
+    def test_high_priority_bypasses_digest(self):
+        """Test high-scoring leads get an immediate alert."""
+        from tools.slack import dispatch_notifications
+        
+        state = {"score": 0.9, "normalized": {"full_name": "Jane Doe"}, "notifications": []}
+        
+        notification = asyncio.run(dispatch_notifications(state))
+        
+        assert notification.startswith("high_priority_slack:")
+        assert state["notifications"] == [notification]
+    
+    def test_regular_leads_share_digest(self, monkeypatch):
+        """Test concurrent regular leads are posted as one digest."""
+        import tools.slack as slack_module
+        
+        posted = []
+        
+        async def fake_digest(states, channel=None):
+            posted.append(len(states))
+            return "digest_ts"
+        
+        monkeypatch.setattr(slack_module.slack_notifier, "send_lead_digest_async", fake_digest)
+        monkeypatch.setattr(
+            slack_module,
+            "slack_batcher",
+            AsyncBatcher(slack_module._post_digest, max_batch_size=10, max_delay=0.01)
+        )
+        states = [{"score": 0.5, "notifications": []} for _ in range(3)]
+        
+        async def run():
+            return await asyncio.gather(*[slack_module.dispatch_notifications(s) for s in states])
+        
+        assert asyncio.run(run()) == ["slack:digest_ts"] * 3
+        assert posted == [3]
+    
+    def test_web_api_errors_return_none(self, monkeypatch):
+        """Test messages are posted as JSON and Slack "ok": false responses fail softly."""
+        import tools.slack as slack_module
+        
+        sent = []
+        
+        class FakeResponse:
+            status_code = 200
+            headers = {}
+            
+            def __init__(self, content):
+                self.content = content
+            
+            def raise_for_status(self):
+                pass
+        
+        class FakeClient:
+            async def post(self, method, content=None):
+                payload = json.loads(content)
+                sent.append((method, payload["channel"]))
+                if payload["channel"] == "#broken":
+                    return FakeResponse(b'{"ok": false, "error": "channel_not_found"}')
+                return FakeResponse(b'{"ok": true, "ts": "123.456"}')
+        
+        monkeypatch.setattr(slack_module.slack_notifier, "token", "xoxb-test")
+        monkeypatch.setattr(slack_module, "get_http_client", lambda vendor: FakeClient())
+        state = {"score": 0.9, "normalized": {"full_name": "Jane Doe"}}
+        
+        async def run():
+            return await asyncio.gather(
+                slack_module.slack_notifier.send_lead_notification_async(state),
+                slack_module.slack_notifier.send_lead_notification_async(state, channel="#broken")
+            )
+        
+        assert asyncio.run(run()) == ["123.456", None]
+        assert sent == [("chat.postMessage", "#sales-leads"), ("chat.postMessage", "#broken")]
 
 if __name__ == "__main__":
     # Run tests
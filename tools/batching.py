@@ -0,0 +1,83 @@
+import asyncio
+from typing import Any, Awaitable, Callable, List, Optional, Set, Tuple
+from loguru import logger
+
+class AsyncBatcher:
+    """
+    Coalesce concurrent calls into batches for a single batch function.
+    
+    Items accumulate until `max_batch_size` is reached or `max_delay` seconds
+    have passed since the first pending item, then `batch_fn(items)` is awaited
+    once. It must return one result per item, in order; a result that is an
+    exception instance is raised to that item's caller only.
+    """
+    
+    def __init__(self, batch_fn: Callable[[List[Any]], Awaitable[List[Any]]], max_batch_size: int = 8, max_delay: float = 0.05):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self._pending: List[Tuple[Any, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+    
+    async def process_batched(self, item: Any) -> Any:
+        """
+        Submit an item and wait for its result from the next batch.
+        
+        Args:
+            item: Input passed to the batch function
+        
+        Returns:
+            The batch function's result for this item
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, self._flush)
+        
+        return await future
+    
+    def _flush(self):
+        """Dispatch all pending items as one batch."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        
+        task = asyncio.get_running_loop().create_task(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+    
+    async def _run(self, batch: List[Tuple[Any, asyncio.Future]]):
+        """Run the batch function and resolve each caller's future."""
+        try:
+            results = await self.batch_fn([item for item, _ in batch])
+            if len(results) != len(batch):
+                raise ValueError(f"Batch function returned {len(results)} results for {len(batch)} items")
+        except Exception as e:
+            logger.error("Batch of {} items failed: {}", len(batch), e)
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+    
+    async def aclose(self):
+        """Flush pending items and wait for in-flight batches (call on shutdown)."""
+        self._flush()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
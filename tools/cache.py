@@ -0,0 +1,154 @@
+import os
+import time
+import asyncio
+import orjson
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+import redis.asyncio as redis
+from loguru import logger
+from tools.idempotency import REDIS_MAX_CONNECTIONS
+
+class LocalTTLCache:
+    """In-process LRU cache whose entries also expire after a fixed TTL."""
+    
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+    
+    def get(self, key: str) -> Optional[bytes]:
+        """Get a live entry, refreshing its LRU position."""
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return entry[1]
+    
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        """Store an entry (for at most the cache TTL), evicting the least recently used one when full."""
+        if self.maxsize <= 0:
+            return
+        self._data[key] = (time.monotonic() + min(ttl or self.ttl, self.ttl), value)
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+class RedisCache:
+    """
+    Two-tier JSON cache for vendor responses: an in-process LRU in front
+    of Redis, so repeat keys skip the network and hits are shared across
+    workers. The Redis tier is a no-op when Redis is unavailable.
+    
+    redis.asyncio connections belong to the event loop that opened them, so
+    `r` serves the loop that connected the cache and other loops (e.g. the
+    run_sync background loop) get their own client, created on first use.
+    """
+    
+    def __init__(self, namespace: str, ttl: int, local_maxsize: int = 0, local_ttl: Optional[float] = None):
+        """
+        Initialize the cache.
+        
+        Args:
+            namespace: Key prefix, e.g. "enrich"
+            ttl: Time to live in seconds; 0 disables the cache
+            local_maxsize: Max entries held in process; 0 disables the local tier
+            local_ttl: Local entry lifetime in seconds (defaults to ttl)
+        """
+        self.namespace = namespace
+        self.ttl = ttl
+        self.r = None
+        self._connected = False
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_clients: Dict[asyncio.AbstractEventLoop, redis.Redis] = {}
+        self.local = LocalTTLCache(local_maxsize if ttl > 0 else 0, local_ttl or ttl)
+        
+        if ttl > 0:
+            self.r = self._create_client()
+    
+    def _create_client(self) -> redis.Redis:
+        """Create a Redis client over its own bounded connection pool."""
+        redis_url = os.getenv("REDIS_URL", "redis://localhost:6379")
+        pool = redis.BlockingConnectionPool.from_url(redis_url, max_connections=REDIS_MAX_CONNECTIONS)
+        return redis.Redis(connection_pool=pool)
+    
+    def _client(self) -> Optional[redis.Redis]:
+        """Get the Redis client for the running event loop, or None when Redis is disabled."""
+        if self.r is None:
+            return None
+        loop = asyncio.get_running_loop()
+        if loop is self._loop:
+            return self.r
+        
+        client = self._loop_clients.get(loop)
+        if client is None:
+            # Forget clients whose event loop has gone away
+            for key in [key for key in list(self._loop_clients) if key.is_closed()]:
+                self._loop_clients.pop(key, None)
+            client = self._create_client()
+            self._loop_clients[loop] = client
+        return client
+    
+    async def connect(self):
+        """Verify the Redis connection, disabling the cache if unreachable."""
+        if self._connected:
+            return
+        self._connected = True
+        
+        if self.r is None:
+            return
+        
+        self._loop = asyncio.get_running_loop()
+        try:
+            await self.r.ping()
+        except Exception as e:
+            logger.warning("Cache '{}' disabled, Redis unavailable: {}", self.namespace, e)
+            await self.r.aclose(close_connection_pool=True)
+            self.r = None
+    
+    async def close(self):
+        """Close the Redis connection pool of the loop that connected the cache."""
+        if self.r is not None:
+            await self.r.aclose(close_connection_pool=True)
+    
+    async def get(self, key: str) -> Optional[Any]:
+        """Get a cached value, or None on a miss or error."""
+        # Entries are kept serialized so callers never share mutable objects
+        cached = self.local.get(key)
+        if cached is not None:
+            return orjson.loads(cached)
+        
+        await self.connect()
+        client = self._client()
+        if client is None:
+            return None
+        
+        try:
+            cached = await client.get(f"{self.namespace}:{key}")
+            if not cached:
+                return None
+            self.local.set(key, cached)
+            return orjson.loads(cached)
+        except Exception as e:
+            logger.error("Cache read failed for {}:{}: {}", self.namespace, key, e)
+            return None
+    
+    async def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        """Cache a JSON-serializable value for `ttl` seconds (defaults to the configured TTL)."""
+        if self.ttl <= 0:
+            return
+        ttl = ttl or self.ttl
+        serialized = orjson.dumps(value)
+        self.local.set(key, serialized, ttl)
+        
+        await self.connect()
+        client = self._client()
+        if client is None:
+            return
+        
+        try:
+            await client.set(f"{self.namespace}:{key}", serialized, ex=ttl)
+        except Exception as e:
+            logger.error("Cache write failed for {}:{}: {}", self.namespace, key, e)
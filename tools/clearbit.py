@@ -1,7 +1,53 @@
-import httpx
 import os
+import orjson
+import asyncio
+import hashlib
 from typing import Dict, Any, Optional
 from loguru import logger
+from tools.cache import RedisCache
+from tools.http_clients import get_http_client
+from tools.threads import run_sync
+
+# Repeat domains are common (same company, different contacts), so real
+# Clearbit responses are cached in Redis; 0 disables the cache
+ENRICHMENT_CACHE_TTL = int(os.getenv("ENRICHMENT_CACHE_TTL", str(7 * 86400)))
+# Per-process tier in front of Redis
+ENRICHMENT_LOCAL_CACHE_SIZE = int(os.getenv("ENRICHMENT_LOCAL_CACHE_SIZE", "10000"))
+ENRICHMENT_LOCAL_CACHE_TTL = int(os.getenv("ENRICHMENT_LOCAL_CACHE_TTL", "86400"))
+
+enrichment_cache = RedisCache(
+    "enrich",
+    ttl=ENRICHMENT_CACHE_TTL,
+    local_maxsize=ENRICHMENT_LOCAL_CACHE_SIZE,
+    local_ttl=ENRICHMENT_LOCAL_CACHE_TTL
+)
+
+def _person_cache_key(email: str) -> str:
+    """Cache key for a person, hashed so raw emails are not stored as keys."""
+    return "person:" + hashlib.sha256(email.strip().lower().encode("utf-8")).hexdigest()
+
+def _company_cache_key(domain: str) -> str:
+    """Cache key for a company domain."""
+    return f"company:{domain.strip().lower()}"
+
+# Mock payload templates; each call copies the top level and fills in the
+# lead's email/domain, sharing the (read-only) nested values
+_MOCK_PERSON = {
+    "name": {"fullName": "Mock Person"},
+    "employment": {
+        "title": "Director of Engineering",
+        "seniority": "director"
+    },
+    "location": {"country": "US"}
+}
+
+_MOCK_COMPANY = {
+    "employees": 120,
+    "industry": "SaaS",
+    "category": {"industry": "Technology"},
+    "tech": ["AWS", "Snowflake", "Python"],
+    "location": {"country": "US"}
+}
 
 class ClearbitEnricher:
     """Data enrichment provider using Clearbit API (with fallback to mock data)."""
@@ -10,79 +56,101 @@ class ClearbitEnricher:
         self.api_key = os.getenv("CLEARBIT_API_KEY")
         self.base_url = "https://person.clearbit.com/v2"
         
+        if not self.api_key:
+            logger.warning("No Clearbit API key provided, using mock mode")
+    
     async def enrich_person(self, email: str) -> Dict[str, Any]:
         """Enrich person data using Clearbit Person API."""
         if not self.api_key:
-            logger.warning("No Clearbit API key, using mock data")
+            logger.debug("No Clearbit API key, using mock data")
             return self._mock_person_data(email)
         
+        cached = await enrichment_cache.get(_person_cache_key(email))
+        if cached is not None:
+            return cached
+        
         try:
-            async with httpx.AsyncClient(timeout=20) as client:
-                response = await client.get(
-                    f"{self.base_url}/combined/find",
-                    params={"email": email},
-                    headers={"Authorization": f"Bearer {self.api_key}"}
-                )
-                response.raise_for_status()
-                return response.json()
+            response = await get_http_client("clearbit").get(
+                f"{self.base_url}/combined/find",
+                params={"email": email},
+                headers={"Authorization": f"Bearer {self.api_key}"}
+            )
+            response.raise_for_status()
+            data = orjson.loads(response.content)
+            await enrichment_cache.set(_person_cache_key(email), data)
+            return data
         except Exception as e:
-            logger.error(f"Clearbit person enrichment failed: {e}")
+            logger.error("Clearbit person enrichment failed: {}", e)
             return self._mock_person_data(email)
     
     async def enrich_company(self, domain: str) -> Dict[str, Any]:
         """Enrich company data using Clearbit Company API."""
         if not self.api_key:
-            logger.warning("No Clearbit API key, using mock data")
+            logger.debug("No Clearbit API key, using mock data")
             return self._mock_company_data(domain)
         
+        cached = await enrichment_cache.get(_company_cache_key(domain))
+        if cached is not None:
+            return cached
+        
         try:
-            async with httpx.AsyncClient(timeout=20) as client:
-                response = await client.get(
-                    f"https://company.clearbit.com/v2/companies/find",
-                    params={"domain": domain},
-                    headers={"Authorization": f"Bearer {self.api_key}"}
-                )
-                response.raise_for_status()
-                return response.json()
+            response = await get_http_client("clearbit").get(
+                f"https://company.clearbit.com/v2/companies/find",
+                params={"domain": domain},
+                headers={"Authorization": f"Bearer {self.api_key}"}
+            )
+            response.raise_for_status()
+            data = orjson.loads(response.content)
+            await enrichment_cache.set(_company_cache_key(domain), data)
+            return data
         except Exception as e:
-            logger.error(f"Clearbit company enrichment failed: {e}")
+            logger.error("Clearbit company enrichment failed: {}", e)
             return self._mock_company_data(domain)
     
     def _mock_person_data(self, email: str) -> Dict[str, Any]:
         """Generate mock person data for testing/fallback."""
-        return {
-            "person": {
-                "email": email,
-                "name": {"fullName": "Mock Person"},
-                "employment": {
-                    "title": "Director of Engineering",
-                    "seniority": "director"
-                },
-                "location": {"country": "US"}
-            }
-        }
+        return {"person": {**_MOCK_PERSON, "email": email}}
     
     def _mock_company_data(self, domain: str) -> Dict[str, Any]:
         """Generate mock company data for testing/fallback."""
-        return {
-            "company": {
-                "domain": domain,
-                "name": f"Mock Company ({domain})",
-                "employees": 120,
-                "industry": "SaaS",
-                "category": {"industry": "Technology"},
-                "tech": ["AWS", "Snowflake", "Python"],
-                "location": {"country": "US"}
-            }
-        }
+        return {"company": {**_MOCK_COMPANY, "domain": domain, "name": f"Mock Company ({domain})"}}
 
 # Global enricher instance
 enricher = ClearbitEnricher()
 
+def _combine_enrichment(company_data: Dict[str, Any], person_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Combine and normalize company and person enrichment payloads."""
+    return {
+        "company": company_data.get("company", {}),
+        "person": person_data.get("person", {}),
+        "enrichment_source": "clearbit" if enricher.api_key else "mock"
+    }
+
+async def _empty_result() -> Dict[str, Any]:
+    """Placeholder for a lookup that is skipped."""
+    return {}
+
+def _fallback_enrichment(domain: Optional[str], email: Optional[str]) -> Dict[str, Any]:
+    """Basic mock data returned when enrichment fails outright."""
+    return {
+        "company": {
+            "domain": domain,
+            "employees": 100,
+            "industry": "Technology"
+        },
+        "person": {
+            "email": email,
+            "seniority": "manager"
+        },
+        "enrichment_source": "fallback"
+    }
+
 def enrich_domain_person(domain: Optional[str] = None, email: Optional[str] = None) -> Dict[str, Any]:
     """
     Enrich lead data with company and person information.
     
+    For synchronous callers; async code should await enrich_domain_person_async.
+    
     Args:
         domain: Company domain for company enrichment
         email: Person email for person enrichment
@@ -90,45 +158,35 @@ def enrich_domain_person(domain: Optional[str] = None, email: Optional[str] = No
     Returns:
         Combined enrichment data
     """
-    import asyncio
-    
     try:
-        # Run async enrichment functions
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
+        return run_sync(enrich_domain_person_async(domain, email))
         
-        company_data = {}
-        person_data = {}
-        
-        if domain:
-            company_data = loop.run_until_complete(enricher.enrich_company(domain))
-        
-        if email:
-            person_data = loop.run_until_complete(enricher.enrich_person(email))
-        
-        loop.close()
+    except Exception as e:
+        logger.error("Enrichment failed: {}", e)
+        # Return basic mock data as fallback
+        return _fallback_enrichment(domain, email)
+
+async def enrich_domain_person_async(domain: Optional[str] = None, email: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Enrich lead data with company and person information from within a running event loop.
+    
+    Args:
+        domain: Company domain for company enrichment
+        email: Person email for person enrichment
         
-        # Combine and normalize data
-        enrichment = {
-            "company": company_data.get("company", {}),
-            "person": person_data.get("person", {}),
-            "enrichment_source": "clearbit" if enricher.api_key else "mock"
-        }
+    Returns:
+        Combined enrichment data
+    """
+    try:
+        # Company and person lookups are independent, so run them concurrently
+        company_data, person_data = await asyncio.gather(
+            enricher.enrich_company(domain) if domain else _empty_result(),
+            enricher.enrich_person(email) if email else _empty_result()
+        )
         
-        return enrichment
+        return _combine_enrichment(company_data, person_data)
         
     except Exception as e:
-        logger.error(f"Enrichment failed: {e}")
+        logger.error("Enrichment failed: {}", e)
         # Return basic mock data as fallback
-        return {
-            "company": {
-                "domain": domain,
-                "employees": 100,
-                "industry": "Technology"
-            },
-            "person": {
-                "email": email,
-                "seniority": "manager"
-            },
-            "enrichment_source": "fallback"
-        }
+        return _fallback_enrichment(domain, email)
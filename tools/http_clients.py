@@ -0,0 +1,79 @@
+import os
+import asyncio
+import httpx
+from typing import Any, Dict, Tuple
+from loguru import logger
+
+# Connection pool sizing shared by all vendor clients
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "50"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+
+# HTTP/2 multiplexes concurrent requests to a vendor over one TLS connection;
+# it needs the h2 package (httpx[http2]), otherwise clients stay on HTTP/1.1
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() == "true"
+try:
+    import h2  # noqa: F401
+except ImportError:
+    if HTTP2_ENABLED:
+        logger.warning("h2 not installed, vendor HTTP clients will use HTTP/1.1")
+    HTTP2_ENABLED = False
+
+# One pooled client per (vendor, event loop), created on first use; pooled
+# connections belong to the loop that opened them, so loops never share one
+_clients: Dict[Tuple[str, asyncio.AbstractEventLoop], httpx.AsyncClient] = {}
+
+# Extra AsyncClient settings per vendor (base_url, default headers, ...)
+_client_options: Dict[str, Dict[str, Any]] = {}
+
+def configure_http_client(vendor: str, **options: Any):
+    """Register settings applied when a vendor's client is created, e.g. base_url and auth headers."""
+    _client_options[vendor] = options
+
+def get_http_client(vendor: str) -> httpx.AsyncClient:
+    """
+    Get the shared AsyncClient for a vendor so connections (and TLS sessions) are reused.
+    
+    Args:
+        vendor: Vendor name, e.g. "clearbit", "hubspot", "openai"
+    
+    Returns:
+        Pooled httpx.AsyncClient
+    """
+    loop = asyncio.get_running_loop()
+    client = _clients.get((vendor, loop))
+    if client is None or client.is_closed:
+        # Forget clients whose event loop has gone away
+        for key in [key for key in _clients if key[1].is_closed()]:
+            del _clients[key]
+        
+        client = httpx.AsyncClient(
+            http2=HTTP2_ENABLED,
+            timeout=HTTP_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+            ),
+            **_client_options.get(vendor, {})
+        )
+        _clients[(vendor, loop)] = client
+    return client
+
+def warm_http_clients(*vendors: str):
+    """Create vendor clients up front (call at startup) so the first leads skip pool setup."""
+    for vendor in vendors:
+        get_http_client(vendor)
+
+async def close_http_clients():
+    """Close the current event loop's vendor clients (call on application shutdown)."""
+    loop = asyncio.get_running_loop()
+    for (vendor, client_loop), client in list(_clients.items()):
+        if client_loop is not loop:
+            continue
+        try:
+            await client.aclose()
+        except Exception as e:
+            logger.error("Failed to close {} HTTP client: {}", vendor, e)
+        del _clients[(vendor, client_loop)]
@@ -1,7 +1,38 @@
-import httpx
 import os
-from typing import Dict, Any, Optional
+import asyncio
+import httpx
+import orjson
+from types import MappingProxyType
+from typing import Dict, Any, List, Optional
 from loguru import logger
+from tools.batching import AsyncBatcher
+from tools.cache import RedisCache
+from tools.http_clients import configure_http_client, get_http_client
+
+# Contact upserts are coalesced into HubSpot batch calls (max 100 inputs each)
+HUBSPOT_BATCH_SIZE = min(int(os.getenv("HUBSPOT_BATCH_SIZE", "100")), 100)
+HUBSPOT_BATCH_DELAY = float(os.getenv("HUBSPOT_BATCH_DELAY", "0.5"))
+# Owner lookups sit on the routing path, so they wait far less before flushing
+HUBSPOT_READ_DELAY = float(os.getenv("HUBSPOT_READ_DELAY", "0.02"))
+
+# Owners of known contacts are cached so repeat emails skip the HubSpot lookup;
+# unknown emails are cached briefly so bursts don't re-search them (0 disables)
+OWNER_CACHE_TTL = int(os.getenv("OWNER_CACHE_TTL", "3600"))
+OWNER_NEGATIVE_CACHE_TTL = int(os.getenv("OWNER_NEGATIVE_CACHE_TTL", "60"))
+
+owner_cache = RedisCache(
+    "owner_cache",
+    ttl=OWNER_CACHE_TTL,
+    local_maxsize=10000,
+    local_ttl=OWNER_NEGATIVE_CACHE_TTL
+)
+
+# Industry-specific owners, used when no territory matches (keys lowercase)
+INDUSTRY_ROUTES = MappingProxyType({
+    "saas": "saas-team@company.com",
+    "fintech": "fintech-team@company.com",
+    "ecommerce": "ecommerce-team@company.com"
+})
 
 class HubSpotClient:
     """HubSpot CRM integration client."""
@@ -12,6 +43,9 @@ class HubSpotClient:
         
         if not self.api_key:
             logger.warning("No HubSpot API key provided, using mock mode")
+        
+        # Base URL and auth/JSON headers live on the pooled client instead of every request
+        configure_http_client("hubspot", base_url=self.base_url, headers=self._get_headers())
     
     def _get_headers(self) -> Dict[str, str]:
         """Get headers for HubSpot API requests."""
@@ -20,7 +54,7 @@ class HubSpotClient:
             "Content-Type": "application/json"
         } if self.api_key else {}
     
-    def find_owner_by_rules(self, normalized: Dict[str, Any], enrichment: Dict[str, Any], routes: Dict[str, str]) -> str:
+    async def find_owner_by_rules(self, normalized: Dict[str, Any], enrichment: Dict[str, Any], routes: Dict[str, str]) -> str:
         """
         Find appropriate owner based on routing rules.
         
@@ -38,36 +72,27 @@ class HubSpotClient:
         
         try:
             # Try to find existing contact first
-            existing_contact = self._find_contact_by_email(normalized.get("email"))
-            if existing_contact and existing_contact.get("properties", {}).get("hubspot_owner_id"):
-                return existing_contact["properties"]["hubspot_owner_id"]
+            existing_owner = await self._existing_owner_id(normalized.get("email"))
+            if existing_owner:
+                return existing_owner
             
-            # Apply routing rules
+            # Apply routing rules (route keys are uppercased when the rules are loaded)
             country = (normalized.get("country") or "").upper()
-            industry = (enrichment.get("company", {}).get("industry") or "").lower()
             
-            # Check for specific territory matches
-            if country in routes:
-                return routes[country]
-            
-            # Check for industry-specific routing
-            industry_routes = {
-                "saas": "saas-team@company.com",
-                "fintech": "fintech-team@company.com",
-                "ecommerce": "ecommerce-team@company.com"
-            }
-            
-            if industry in industry_routes:
-                return industry_routes[industry]
+            # Check for specific territory matches, then industry-specific routing
+            owner = routes.get(country)
+            if owner is None:
+                industry = ((enrichment.get("company") or {}).get("industry") or "").lower()
+                owner = INDUSTRY_ROUTES.get(industry)
             
             # Default fallback
-            return routes.get("DEFAULT", "unassigned@company.com")
+            return owner or routes.get("DEFAULT", "unassigned@company.com")
             
         except Exception as e:
-            logger.error(f"Owner lookup failed: {e}")
+            logger.error("Owner lookup failed: {}", e)
             return routes.get("DEFAULT", "unassigned@company.com")
     
-    def create_or_update_contact(self, state: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    async def create_or_update_contact(self, state: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """
         Create or update contact in HubSpot.
         
@@ -82,94 +107,154 @@ class HubSpotClient:
             return self._mock_contact_creation(state)
         
         try:
-            normalized = state.get("normalized", {})
-            enrichment = state.get("enrichment", {})
-            
-            # Prepare contact properties
-            properties = {
-                "email": normalized.get("email"),
-                "firstname": normalized.get("full_name", "").split()[0] if normalized.get("full_name") else "",
-                "lastname": " ".join(normalized.get("full_name", "").split()[1:]) if normalized.get("full_name") else "",
-                "company": normalized.get("company"),
-                "jobtitle": normalized.get("title"),
-                "country": normalized.get("country"),
-                "lead_score": str(state.get("score", 0)),
-                "lead_source": normalized.get("source", "webhook")
-            }
-            
-            # Add enrichment data
-            if enrichment.get("company"):
-                properties.update({
-                    "company_size": str(enrichment["company"].get("employees", "")),
-                    "industry": enrichment["company"].get("industry", ""),
-                    "website": enrichment["company"].get("domain", "")
-                })
-            
-            # Check if contact exists
-            existing_contact = self._find_contact_by_email(normalized.get("email"))
-            
-            if existing_contact:
-                # Update existing contact
-                contact_id = existing_contact["id"]
-                response = self._update_contact(contact_id, properties)
-                logger.info(f"Updated existing contact {contact_id}")
-                return {"id": contact_id, "action": "updated"}
-            else:
-                # Create new contact
-                response = self._create_contact(properties)
-                contact_id = response.get("id")
-                logger.info(f"Created new contact {contact_id}")
-                return {"id": contact_id, "action": "created"}
+            result = await contact_batcher.process_batched(self._contact_properties(state))
+            logger.info("Upserted contact {} ({})", result['id'], result['action'])
+            return result
                 
         except Exception as e:
-            logger.error(f"Contact creation/update failed: {e}")
+            logger.error("Contact creation/update failed: {}", e)
             return None
     
-    def _find_contact_by_email(self, email: str) -> Optional[Dict[str, Any]]:
-        """Find contact by email address."""
-        try:
-            async with httpx.AsyncClient(timeout=20) as client:
-                response = await client.get(
-                    f"{self.base_url}/crm/v3/objects/contacts/search",
-                    headers=self._get_headers(),
-                    json={
-                        "filterGroups": [{
-                            "filters": [{
-                                "propertyName": "email",
-                                "operator": "EQ",
-                                "value": email
-                            }]
-                        }]
-                    }
-                )
-                response.raise_for_status()
-                data = response.json()
-                return data.get("results", [{}])[0] if data.get("results") else None
-        except Exception as e:
-            logger.error(f"Contact search failed: {e}")
-            return None
+    def _contact_properties(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """Build HubSpot contact properties from the lead state."""
+        normalized = state.get("normalized", {})
+        enrichment = state.get("enrichment", {})
+        
+        first_name, _, last_name = (normalized.get("full_name") or "").strip().partition(" ")
+        
+        # Prepare contact properties
+        properties = {
+            "email": normalized.get("email"),
+            "firstname": first_name,
+            "lastname": last_name.strip(),
+            "company": normalized.get("company"),
+            "jobtitle": normalized.get("title"),
+            "country": normalized.get("country"),
+            "lead_score": str(state.get("score", 0)),
+            "lead_source": normalized.get("source", "webhook")
+        }
+        
+        # Add enrichment data
+        if enrichment.get("company"):
+            properties.update({
+                "company_size": str(enrichment["company"].get("employees", "")),
+                "industry": enrichment["company"].get("industry", ""),
+                "website": enrichment["company"].get("domain", "")
+            })
+        
+        return properties
     
-    def _create_contact(self, properties: Dict[str, Any]) -> Dict[str, Any]:
-        """Create new contact in HubSpot."""
-        async with httpx.AsyncClient(timeout=20) as client:
-            response = await client.post(
-                f"{self.base_url}/crm/v3/objects/contacts",
-                headers=self._get_headers(),
-                json={"properties": properties}
-            )
-            response.raise_for_status()
-            return response.json()
+    async def upsert_contacts(self, properties_list: List[Dict[str, Any]]) -> List[Any]:
+        """
+        Create or update many contacts in one call, matched by email.
+        
+        Args:
+            properties_list: Contact properties, one dict per lead
+            
+        Returns:
+            One {"id", "action"} record per input, or an exception for inputs
+            HubSpot rejected, without an email, or missing from the response
+        """
+        # Upserts are keyed by email; the last write for a repeated email wins
+        inputs = {}
+        for properties in properties_list:
+            email = (properties.get("email") or "").lower()
+            if email:
+                inputs[email] = {"idProperty": "email", "id": email, "properties": properties}
+        
+        records = await self._upsert_inputs(list(inputs.values())) if inputs else {}
+        
+        results = []
+        for properties in properties_list:
+            record = records.get((properties.get("email") or "").lower())
+            results.append(record or ValueError(f"No HubSpot record returned for {properties.get('email')!r}"))
+        return results
     
-    def _update_contact(self, contact_id: str, properties: Dict[str, Any]) -> Dict[str, Any]:
-        """Update existing contact in HubSpot."""
-        async with httpx.AsyncClient(timeout=20) as client:
-            response = await client.patch(
-                f"{self.base_url}/crm/v3/objects/contacts/{contact_id}",
-                headers=self._get_headers(),
-                json={"properties": properties}
-            )
+    async def _upsert_inputs(self, inputs: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Send one batch upsert, bisecting it when HubSpot rejects the batch.
+        
+        A 4xx for the whole batch usually comes from one bad input (e.g. an
+        invalid property value), so the halves are retried until only the
+        rejected inputs fail. Other errors fail the whole batch.
+        
+        Returns:
+            Email -> {"id", "action"} record, or the HTTPStatusError for a rejected input
+        """
+        response = await get_http_client("hubspot").post(
+            "/crm/v3/objects/contacts/batch/upsert",
+            content=orjson.dumps({"inputs": inputs})
+        )
+        try:
             response.raise_for_status()
-            return response.json()
+        except httpx.HTTPStatusError as e:
+            if not 400 <= response.status_code < 500 or response.status_code == 429:
+                raise
+            if len(inputs) == 1:
+                logger.error("HubSpot rejected contact {}: {}", inputs[0]["id"], e)
+                return {inputs[0]["id"]: e}
+            
+            middle = len(inputs) // 2
+            halves = await asyncio.gather(self._upsert_inputs(inputs[:middle]), self._upsert_inputs(inputs[middle:]))
+            return {**halves[0], **halves[1]}
+        
+        records = {}
+        for record in orjson.loads(response.content).get("results", []):
+            email = (record.get("properties", {}).get("email") or "").lower()
+            records[email] = {"id": record.get("id"), "action": "created" if record.get("new") else "updated"}
+        return records
+    
+    async def read_contacts_by_email(self, emails: List[str]) -> List[Optional[Dict[str, Any]]]:
+        """
+        Look up many contacts in one call.
+        
+        Args:
+            emails: Lowercased email addresses
+            
+        Returns:
+            One contact record (id + owner/email properties) or None per email
+        """
+        response = await get_http_client("hubspot").post(
+            "/crm/v3/objects/contacts/batch/read",
+            content=orjson.dumps({
+                "properties": ["hubspot_owner_id", "email"],
+                "idProperty": "email",
+                "inputs": [{"id": email} for email in dict.fromkeys(emails)]
+            })
+        )
+        response.raise_for_status()
+        
+        # Unknown emails are reported as errors in a 207 response and simply have no result
+        contacts = {}
+        for record in orjson.loads(response.content).get("results", []):
+            email = (record.get("properties", {}).get("email") or "").lower()
+            contacts[email] = record
+        return [contacts.get(email) for email in emails]
+    
+    async def _existing_owner_id(self, email: Optional[str]) -> Optional[str]:
+        """Get the HubSpot owner of an existing contact, via the owner cache."""
+        if not email:
+            return None
+        email = email.lower()
+        
+        cached = await owner_cache.get(email)
+        if cached is not None:
+            return cached.get("owner_id")
+        
+        try:
+            contact = await contact_reader.process_batched(email)
+        except Exception as e:
+            # Lookup errors are not cached
+            logger.error("Contact search failed: {}", e)
+            return None
+        
+        owner_id = (contact or {}).get("properties", {}).get("hubspot_owner_id")
+        await owner_cache.set(
+            email,
+            {"owner_id": owner_id},
+            ttl=OWNER_CACHE_TTL if owner_id else OWNER_NEGATIVE_CACHE_TTL
+        )
+        return owner_id
     
     def _mock_owner_assignment(self, normalized: Dict[str, Any], enrichment: Dict[str, Any], routes: Dict[str, str]) -> str:
         """Mock owner assignment for testing."""
@@ -183,10 +268,22 @@ class HubSpotClient:
 # Global HubSpot client instance
 hubspot_client = HubSpotClient()
 
-def find_owner_by_rules(normalized: Dict[str, Any], enrichment: Dict[str, Any], routes: Dict[str, str]) -> str:
+# Global contact lookup and upsert batchers; flushed on application shutdown
+contact_reader = AsyncBatcher(
+    hubspot_client.read_contacts_by_email,
+    max_batch_size=HUBSPOT_BATCH_SIZE,
+    max_delay=HUBSPOT_READ_DELAY
+)
+contact_batcher = AsyncBatcher(
+    hubspot_client.upsert_contacts,
+    max_batch_size=HUBSPOT_BATCH_SIZE,
+    max_delay=HUBSPOT_BATCH_DELAY
+)
+
+async def find_owner_by_rules(normalized: Dict[str, Any], enrichment: Dict[str, Any], routes: Dict[str, str]) -> str:
     """Find owner using the global HubSpot client."""
-    return hubspot_client.find_owner_by_rules(normalized, enrichment, routes)
+    return await hubspot_client.find_owner_by_rules(normalized, enrichment, routes)
 
-def create_or_update_contact(state: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+async def create_or_update_contact(state: Dict[str, Any]) -> Optional[Dict[str, Any]]:
     """Create or update contact using the global HubSpot client."""
-    return hubspot_client.create_or_update_contact(state)
+    return await hubspot_client.create_or_update_contact(state)
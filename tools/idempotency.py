@@ -1,33 +1,98 @@
 import time
-import redis
+import heapq
+import orjson
+import hashlib
 import os
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+import redis.asyncio as redis
 from loguru import logger
+from tools.batching import AsyncBatcher
+
+# Concurrent checks are coalesced into one Redis pipeline per event loop tick
+IDEM_BATCH_SIZE = int(os.getenv("IDEM_BATCH_SIZE", "100"))
+# Upper bound on pooled Redis connections per process
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
+# Max keys held by the in-memory fallback before the oldest are evicted
+IDEM_MEMORY_MAXSIZE = int(os.getenv("IDEM_MEMORY_MAXSIZE", "100000"))
+
+def payload_fingerprint(payload: Dict[str, Any]) -> str:
+    """SHA-256 of the payload's canonical JSON, used to spot key reuse with different data."""
+    canonical = orjson.dumps(payload, option=orjson.OPT_SORT_KEYS, default=str)
+    return hashlib.sha256(canonical).hexdigest()
+
+def idempotency_key(payload: Dict[str, Any], fingerprint: Optional[str] = None) -> str:
+    """
+    Pick the dedup key for a lead payload.
+    
+    Prefers the sender's event_id, then the email; anonymous payloads fall
+    back to their fingerprint so distinct leads never share a key.
+    """
+    return payload.get("event_id") or payload.get("email") or (fingerprint or payload_fingerprint(payload))[:32]
 
 class Idem:
     """Redis-based idempotency checker to prevent duplicate lead processing."""
     
-    def __init__(self):
-        """Initialize Redis connection."""
-        try:
+    def __init__(self, backend: Optional[str] = None):
+        """
+        Initialize the idempotency store.
+        
+        Args:
+            backend: "redis" (shared across workers) or "memory" (single process,
+                local dev); defaults to the IDEMPOTENCY_BACKEND env var
+        """
+        self.backend = (backend or os.getenv("IDEMPOTENCY_BACKEND", "redis")).lower()
+        self.r = None
+        self.pool = None
+        # In-memory fallback: key -> (expires_at, value) in LRU order, plus a
+        # min-heap of (expires_at, key) so expired keys are dropped in O(log n)
+        self._memory_keys: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._memory_expiry: List[Tuple[float, str]] = []
+        self._connected = False
+        self._batcher = AsyncBatcher(self._set_many, max_batch_size=IDEM_BATCH_SIZE, max_delay=0)
+        
+        if self.backend == "redis":
             redis_url = os.getenv("REDIS_URL", "redis://localhost:6379")
-            self.r = redis.from_url(redis_url)
-            # Test connection
-            self.r.ping()
+            # Bounded pool (callers wait for a free connection); replies are
+            # parsed by hiredis when it is installed
+            self.pool = redis.BlockingConnectionPool.from_url(redis_url, max_connections=REDIS_MAX_CONNECTIONS)
+            self.r = redis.Redis(connection_pool=self.pool)
+        else:
+            logger.info("Using in-memory idempotency store")
+    
+    async def connect(self):
+        """Verify the Redis connection, falling back to in-memory storage if unreachable."""
+        if self._connected:
+            return
+        self._connected = True
+        
+        if self.r is None:
+            return
+        
+        try:
+            await self.r.ping()
             logger.info("Redis connection established successfully")
         except Exception as e:
-            logger.error(f"Redis connection failed: {e}")
+            logger.error("Redis connection failed: {}", e)
             # Fallback to in-memory storage (not recommended for production)
+            await self.r.aclose(close_connection_pool=True)
             self.r = None
-            self._memory_keys = set()
     
-    def check_and_set(self, key: str, ttl: int = 3600) -> bool:
+    async def close(self):
+        """Flush pending checks and close the Redis connection pool."""
+        await self._batcher.aclose()
+        if self.r is not None:
+            await self.r.aclose(close_connection_pool=True)
+    
+    async def check_and_set(self, key: str, ttl: int = 3600, fingerprint: Optional[str] = None) -> bool:
         """
         Check if key exists and set it if it doesn't.
         
         Args:
             key: Unique identifier for the lead
             ttl: Time to live in seconds (default: 1 hour)
-            
+            fingerprint: Optional payload fingerprint stored with the key
+        
         Returns:
             True if key was set (new lead), False if already exists
         """
@@ -35,48 +100,125 @@ class Idem:
             logger.warning("Empty key provided to idempotency check")
             return False
         
+        # Calls arriving in the same loop tick share one Redis round trip
+        return await self._batcher.process_batched((key, ttl, fingerprint))
+    
+    async def check_and_set_many(self, keys: List[str], ttl: int = 3600, fingerprints: Optional[List[Optional[str]]] = None) -> List[bool]:
+        """
+        Check and set many keys in a single Redis round trip.
+        
+        Args:
+            keys: Unique identifiers for the leads
+            ttl: Time to live in seconds (default: 1 hour)
+            fingerprints: Optional payload fingerprints, one per key
+        
+        Returns:
+            One flag per key: True if newly set, False if it already existed
+        """
+        fingerprints = fingerprints or [None] * len(keys)
+        return await self._set_many([(key, ttl, fp) for key, fp in zip(keys, fingerprints)])
+    
+    async def _set_many(self, entries: List[Tuple[str, int, Optional[str]]]) -> List[bool]:
+        """SET NX each (key, ttl, fingerprint) entry, pipelined when using Redis."""
+        await self.connect()
+        
         try:
             if self.r:
-                # Use Redis
-                result = self.r.set(
-                    name=f"idem:{key}", 
-                    value=int(time.time()), 
-                    ex=ttl, 
-                    nx=True
-                )
-                return result is True
+                # Use Redis (atomic per key across workers and instances); the
+                # value is just the fingerprint, processing time comes from the TTL
+                pipe = self.r.pipeline(transaction=False)
+                for key, ttl, fingerprint in entries:
+                    pipe.set(name=f"idem:{key}", value=fingerprint or b"", ex=ttl, nx=True)
+                return [result is True for result in await pipe.execute()]
             else:
                 # Fallback to in-memory
-                if key in self._memory_keys:
-                    return False
-                self._memory_keys.add(key)
-                return True
-                
+                self._purge_expired()
+                results = []
+                for key, ttl, fingerprint in entries:
+                    if key in self._memory_keys:
+                        self._memory_keys.move_to_end(key)
+                        results.append(False)
+                    else:
+                        self._memory_set(key, ttl, fingerprint or "")
+                        results.append(True)
+                return results
+        
         except Exception as e:
-            logger.error(f"Idempotency check failed: {e}")
+            logger.error("Idempotency check failed: {}", e)
             # Fail open - allow processing to continue
-            return True
+            return [True] * len(entries)
     
-    def get_processing_time(self, key: str) -> int:
-        """Get when the lead was processed (for debugging)."""
+    def _memory_set(self, key: str, ttl: int, value: str):
+        """Store a key in the in-memory fallback, evicting the least recently used past the cap."""
+        expires_at = time.monotonic() + ttl
+        self._memory_keys[key] = (expires_at, value)
+        heapq.heappush(self._memory_expiry, (expires_at, key))
+        
+        if len(self._memory_keys) > IDEM_MEMORY_MAXSIZE:
+            self._memory_keys.popitem(last=False)
+        # Evicted and cleared keys leave stale heap entries; rebuild if they pile up
+        if len(self._memory_expiry) > 2 * IDEM_MEMORY_MAXSIZE:
+            self._memory_expiry = [(entry[0], k) for k, entry in self._memory_keys.items()]
+            heapq.heapify(self._memory_expiry)
+    
+    def _purge_expired(self):
+        """Drop in-memory keys whose TTL has passed."""
+        now = time.monotonic()
+        while self._memory_expiry and self._memory_expiry[0][0] <= now:
+            expires_at, key = heapq.heappop(self._memory_expiry)
+            entry = self._memory_keys.get(key)
+            # Skip heap entries for keys that were since evicted or re-set
+            if entry is not None and entry[0] == expires_at:
+                del self._memory_keys[key]
+    
+    async def _get_value(self, key: str) -> Optional[str]:
+        """Read the stored fingerprint value ("" when none was given) for a key."""
+        await self.connect()
+        if self.r:
+            value = await self.r.get(f"idem:{key}")
+            return value.decode() if value else None
+        self._purge_expired()
+        entry = self._memory_keys.get(key)
+        return entry[1] if entry else None
+    
+    async def get_fingerprint(self, key: str) -> Optional[str]:
+        """Get the payload fingerprint stored with a key, if any."""
+        try:
+            return await self._get_value(key) or None
+        except Exception as e:
+            logger.error("Failed to get fingerprint: {}", e)
+            return None
+    
+    async def get_processing_time(self, key: str, ttl: int = 3600) -> int:
+        """
+        Get when the lead was processed (for debugging).
+        
+        Derived from the key's remaining TTL, so `ttl` must match the one
+        passed to check_and_set.
+        """
         try:
+            await self.connect()
             if self.r:
-                timestamp = self.r.get(f"idem:{key}")
-                return int(timestamp) if timestamp else 0
+                remaining = await self.r.ttl(f"idem:{key}")
             else:
-                return 0
+                self._purge_expired()
+                entry = self._memory_keys.get(key)
+                remaining = entry[0] - time.monotonic() if entry else -2
+            # Negative TTLs mean the key is missing or has no expiry
+            return int(time.time() - (ttl - remaining)) if remaining >= 0 else 0
         except Exception as e:
-            logger.error(f"Failed to get processing time: {e}")
+            logger.error("Failed to get processing time: {}", e)
             return 0
     
-    def clear_key(self, key: str) -> bool:
+    async def clear_key(self, key: str) -> bool:
         """Manually clear a key (for testing/debugging)."""
         try:
+            await self.connect()
             if self.r:
-                return bool(self.r.delete(f"idem:{key}"))
+                return bool(await self.r.delete(f"idem:{key}"))
             else:
-                self._memory_keys.discard(key)
+                self._memory_keys.pop(key, None)
                 return True
         except Exception as e:
-            logger.error(f"Failed to clear key: {e}")
+            logger.error("Failed to clear key: {}", e)
             return False
@@ -1,7 +1,123 @@
 import os
-import json
-from typing import Tuple, List, Dict, Any
+import orjson
+import hashlib
+import asyncio
+import openai
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 from loguru import logger
+from tools.batching import AsyncBatcher
+from tools.cache import RedisCache
+from tools.ratelimit import AdaptiveLimiter, RateLimited, retry_after_seconds
+from tools.http_clients import get_http_client
+from tools.threads import run_sync
+
+# Dynamic batching of concurrent scoring calls
+LLM_BATCH_SIZE = int(os.getenv("LLM_BATCH_SIZE", "8"))
+LLM_BATCH_DELAY = float(os.getenv("LLM_BATCH_DELAY", "0.05"))
+
+# Requests per minute across completions and embeddings; halved on 429s
+OPENAI_RPM = float(os.getenv("OPENAI_RPM", "500"))
+openai_limiter = AdaptiveLimiter("openai", OPENAI_RPM)
+
+async def _rate_limited_openai(call: Callable[[], Awaitable[Any]]) -> Any:
+    """Run one OpenAI call within openai_limiter, backing off on rate-limit errors."""
+    async def attempt():
+        try:
+            return await call()
+        except openai.RateLimitError as e:
+            raise RateLimited(retry_after_seconds(e.response.headers)) from e
+    
+    return await openai_limiter.call(attempt)
+
+async def _read_json_object(stream) -> str:
+    """
+    Collect a streamed completion up to the end of its first JSON object.
+    
+    The stream is closed as soon as the object's closing brace arrives, so
+    trailing prose is never generated; if no object completes, everything
+    received is returned for the fallback parser.
+    """
+    parts = []
+    depth = 0
+    in_string = escaped = False
+    try:
+        async for chunk in stream:
+            delta = (chunk.choices[0].delta.content or "") if chunk.choices else ""
+            for i, char in enumerate(delta):
+                if in_string:
+                    if escaped:
+                        escaped = False
+                    elif char == "\\":
+                        escaped = True
+                    elif char == '"':
+                        in_string = False
+                elif char == '"' and depth:
+                    in_string = True
+                elif char == "{":
+                    depth += 1
+                elif char == "}" and depth:
+                    depth -= 1
+                    if not depth:
+                        parts.append(delta[:i + 1])
+                        return "".join(parts)
+            parts.append(delta)
+        return "".join(parts)
+    finally:
+        await stream.close()
+
+# Offline re-scoring jobs at least this large use the OpenAI Batch API
+OPENAI_BATCH_MIN_LEADS = int(os.getenv("OPENAI_BATCH_MIN_LEADS", "1000"))
+OPENAI_BATCH_POLL_INTERVAL = float(os.getenv("OPENAI_BATCH_POLL_INTERVAL", "30"))
+
+# Embeddings for similar-account search; concurrent texts share one request
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "256"))
+
+# Title keywords that mark a senior decision maker in mock scoring
+SENIOR_TITLE_KEYWORDS = ("director", "vp", "cxo")
+
+# Exact-match cache of LLM results, keyed by model and prompt, so replayed or
+# identical leads skip OpenAI
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", "86400"))
+LLM_LOCAL_CACHE_SIZE = int(os.getenv("LLM_LOCAL_CACHE_SIZE", "1000"))
+llm_cache = RedisCache("llm", ttl=LLM_CACHE_TTL, local_maxsize=LLM_LOCAL_CACHE_SIZE)
+
+def _prompt_cache_key(kind: str, model: str, prompt: str) -> str:
+    """Cache key for an LLM result, hashed so prompts (and the emails in them) are not stored as keys."""
+    return f"{kind}:" + hashlib.sha256(f"{model}\n{prompt}".encode("utf-8")).hexdigest()
+
+# System prompts, built once so every request sends a byte-identical prefix
+# (OpenAI caches repeated prompt prefixes)
+_SCORING_CRITERIA = """You are a Senior RevOps Analyst tasked with scoring B2B leads.
+
+SCORING CRITERIA:
+- Score range: 0.0 to 1.0
+- ICP industries: SaaS, FinTech, Ecommerce, HealthTech, EdTech
+- Minimum headcount: 20+ employees
+- Preferred titles: Director+, VP, C-level, Head of, Lead
+- Geographic focus: US, CA, UK, DE, FR, MA
+- Penalty for free email domains (gmail, yahoo, etc.)"""
+
+SCORING_RUBRIC = _SCORING_CRITERIA + """
+
+Return ONLY valid JSON in this format:
+{"score": 0.85, "reasons": ["ICP match: SaaS", "Seniority: Director", "Good headcount: 150"]}"""
+
+BATCH_SCORING_RUBRIC = _SCORING_CRITERIA + """
+
+You will receive several leads numbered [1], [2], ... Score each one independently.
+Return ONLY a valid JSON array with one object per lead, using the lead's number as "id":
+[{"id": 1, "score": 0.85, "reasons": ["ICP match: SaaS", "Seniority: Director"]}, {"id": 2, "score": 0.3, "reasons": ["Small company"]}]"""
+
+SUMMARY_RUBRIC = """You are a Sales Operations Specialist creating lead summaries for Account Executives.
+
+Create a concise, actionable summary with 6-8 bullet points covering:
+- Who they are (company, role, industry)
+- Why now (timing signals, pain points)
+- Similar accounts (success stories, patterns)
+- Next best action (immediate next step)
+
+Keep it professional, data-driven, and sales-ready."""
 
 class LLMClient:
     """LLM client for scoring and summarization tasks."""
@@ -9,6 +125,9 @@ class LLMClient:
     def __init__(self):
         self.api_key = os.getenv("OPENAI_API_KEY")
         self.model = os.getenv("OPENAI_MODEL", "gpt-4")
+        # One AsyncOpenAI per event loop (the server loop and the run_sync
+        # loop), built over that loop's pooled HTTP client
+        self._async_clients: Dict[asyncio.AbstractEventLoop, Tuple[Any, openai.AsyncOpenAI]] = {}
         
         if not self.api_key:
             logger.warning("No OpenAI API key provided, using mock mode")
@@ -17,6 +136,36 @@ class LLMClient:
         """
         Score lead using LLM with scoring rubric.
         
+        For synchronous callers; async code should await score_lead_with_rubric_async.
+        
+        Args:
+            state: Lead processing state
+            base_hint: Base score from rule-based scoring
+            
+        Returns:
+            Tuple of (score, reasons)
+        """
+        return run_sync(self.score_lead_with_rubric_async(state, base_hint))
+    
+    def summarize_for_ae(self, state: Dict[str, Any], similar_accounts: List[Dict[str, Any]]) -> str:
+        """
+        Generate lead summary for Account Executives.
+        
+        For synchronous callers; async code should await summarize_for_ae_async.
+        
+        Args:
+            state: Lead processing state
+            similar_accounts: List of similar accounts
+            
+        Returns:
+            Formatted summary string
+        """
+        return run_sync(self.summarize_for_ae_async(state, similar_accounts))
+    
+    async def score_lead_with_rubric_async(self, state: Dict[str, Any], base_hint: float = 0.0) -> Tuple[float, List[str]]:
+        """
+        Score lead using LLM with scoring rubric, without blocking the event loop.
+        
         Args:
             state: Lead processing state
             base_hint: Base score from rule-based scoring
@@ -31,35 +180,177 @@ class LLMClient:
         try:
             # Prepare prompt
             prompt = self._build_scoring_prompt(state, base_hint)
+            cache_key = _prompt_cache_key("score", self.model, prompt)
+            cached = await llm_cache.get(cache_key)
+            if cached is not None:
+                return cached[0], cached[1]
             
-            # Call OpenAI API
-            import openai
-            openai.api_key = self.api_key
-            
-            response = openai.ChatCompletion.create(
+            # Call OpenAI API, streaming so generation stops once the JSON object closes
+            stream = await _rate_limited_openai(lambda: self._get_async_client().chat.completions.create(
                 model=self.model,
                 messages=[
                     {"role": "system", "content": self._get_scoring_rubric()},
                     {"role": "user", "content": prompt}
                 ],
                 temperature=0.1,
-                max_tokens=500
-            )
+                max_tokens=500,
+                stream=True
+            ))
             
             # Parse response
-            content = response.choices[0].message.content
+            content = await _read_json_object(stream)
             result = self._parse_scoring_response(content)
+            if result.get("parsed"):
+                await llm_cache.set(cache_key, [result['score'], result['reasons']])
             
-            logger.info(f"LLM scoring completed: {result['score']}")
+            logger.info("LLM scoring completed: {}", result['score'])
             return result['score'], result['reasons']
             
         except Exception as e:
-            logger.error(f"LLM scoring failed: {e}")
+            logger.error("LLM scoring failed: {}", e)
             return self._mock_scoring(state, base_hint)
     
-    def summarize_for_ae(self, state: Dict[str, Any], similar_accounts: List[Dict[str, Any]]) -> str:
+    async def score_leads_batch(self, states: List[Dict[str, Any]], base_hints: List[float], batch_size: int = LLM_BATCH_SIZE, batch_mode: bool = False) -> List[Tuple[float, List[str]]]:
         """
-        Generate lead summary for Account Executives.
+        Score many leads, packing up to `batch_size` of them into each LLM call.
+        
+        Args:
+            states: Lead processing states
+            base_hints: Rule-based score hint per state
+            batch_size: Max leads per prompt
+            batch_mode: For offline re-scoring; jobs of at least
+                OPENAI_BATCH_MIN_LEADS go through the (slower, cheaper)
+                OpenAI Batch API instead
+            
+        Returns:
+            One (score, reasons) tuple per state, in input order
+        """
+        if batch_mode and self.api_key and len(states) >= OPENAI_BATCH_MIN_LEADS:
+            return await self.score_leads_via_batch(states, base_hints)
+        
+        chunks = [
+            (states[i:i + batch_size], base_hints[i:i + batch_size])
+            for i in range(0, len(states), batch_size)
+        ]
+        results = await asyncio.gather(*[self._score_chunk(chunk_states, chunk_hints) for chunk_states, chunk_hints in chunks])
+        return [result for chunk in results for result in chunk]
+    
+    async def score_leads_via_batch(self, states: List[Dict[str, Any]], base_hints: List[float]) -> List[Tuple[float, List[str]]]:
+        """
+        Score leads with the OpenAI Batch API and wait for the job to finish.
+        
+        Uploads one single-lead scoring request per state, polls the batch every
+        OPENAI_BATCH_POLL_INTERVAL seconds and maps results back by custom_id.
+        Leads whose request failed or whose response cannot be parsed get the
+        mock score, as in the online path.
+        
+        Args:
+            states: Lead processing states
+            base_hints: Rule-based score hint per state
+            
+        Returns:
+            One (score, reasons) tuple per state, in input order
+        """
+        client = self._get_async_client()
+        prompts = [self._build_scoring_prompt(state, base_hint) for state, base_hint in zip(states, base_hints)]
+        requests = b"\n".join(
+            orjson.dumps({
+                "custom_id": str(i),
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": self.model,
+                    "messages": [
+                        {"role": "system", "content": self._get_scoring_rubric()},
+                        {"role": "user", "content": prompt}
+                    ],
+                    "temperature": 0.1,
+                    "max_tokens": 500
+                }
+            })
+            for i, prompt in enumerate(prompts)
+        )
+        
+        input_file = await client.files.create(file=("lead_scoring.jsonl", requests), purpose="batch")
+        batch = await client.batches.create(
+            input_file_id=input_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h"
+        )
+        logger.info("Submitted OpenAI batch {} for {} leads", batch.id, len(states))
+        
+        while batch.status not in ("completed", "failed", "expired", "cancelled"):
+            await asyncio.sleep(OPENAI_BATCH_POLL_INTERVAL)
+            batch = await client.batches.retrieve(batch.id)
+        
+        results: List[Optional[Tuple[float, List[str]]]] = [None] * len(states)
+        if batch.output_file_id:
+            output = await client.files.content(batch.output_file_id)
+            for line in output.content.splitlines():
+                if not line.strip():
+                    continue
+                record = orjson.loads(line)
+                index = int(record["custom_id"])
+                body = (record.get("response") or {}).get("body") or {}
+                if not body.get("choices"):
+                    continue
+                result = self._parse_scoring_response(body["choices"][0]["message"]["content"])
+                if result.get("parsed"):
+                    results[index] = (result["score"], result["reasons"])
+                    await llm_cache.set(_prompt_cache_key("score", self.model, prompts[index]), [result["score"], result["reasons"]])
+        
+        missing = [i for i, result in enumerate(results) if result is None]
+        logger.info("OpenAI batch {} {}: {} of {} leads scored", batch.id, batch.status, len(states) - len(missing), len(states))
+        for i in missing:
+            results[i] = self._mock_scoring(states[i], base_hints[i])
+        return results
+    
+    async def _score_chunk(self, states: List[Dict[str, Any]], base_hints: List[float]) -> List[Tuple[float, List[str]]]:
+        """Score one numbered batch in a single call, re-scoring unparsed leads one by one."""
+        if not self.api_key or len(states) == 1:
+            return [await self.score_lead_with_rubric_async(state, base_hint) for state, base_hint in zip(states, base_hints)]
+        
+        # Cached leads are left out of the prompt
+        cache_keys = [
+            _prompt_cache_key("score", self.model, self._build_scoring_prompt(state, base_hint))
+            for state, base_hint in zip(states, base_hints)
+        ]
+        cached = await asyncio.gather(*[llm_cache.get(cache_key) for cache_key in cache_keys])
+        results = [(entry[0], entry[1]) if entry is not None else None for entry in cached]
+        pending = [i for i, result in enumerate(results) if result is None]
+        
+        if len(pending) > 1:
+            try:
+                response = await _rate_limited_openai(lambda: self._get_async_client().chat.completions.create(
+                    model=self.model,
+                    messages=[
+                        {"role": "system", "content": self._get_batch_scoring_rubric()},
+                        {"role": "user", "content": self._build_batch_scoring_prompt([states[i] for i in pending], [base_hints[i] for i in pending])}
+                    ],
+                    temperature=0.1,
+                    max_tokens=200 * len(pending)
+                ))
+                parsed = self._parse_batch_scoring_response(response.choices[0].message.content, len(pending))
+                for i, result in zip(pending, parsed):
+                    if result is not None:
+                        results[i] = result
+                        await llm_cache.set(cache_keys[i], list(result))
+            except Exception as e:
+                logger.error("Batched LLM scoring failed: {}", e)
+        
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            logger.warning("Re-scoring {} of {} leads individually", len(missing), len(states))
+            rescored = await asyncio.gather(*[self.score_lead_with_rubric_async(states[i], base_hints[i]) for i in missing])
+            for i, result in zip(missing, rescored):
+                results[i] = result
+        
+        logger.info("Batched LLM scoring completed for {} leads", len(states))
+        return results
+    
+    async def summarize_for_ae_async(self, state: Dict[str, Any], similar_accounts: List[Dict[str, Any]]) -> str:
+        """
+        Generate lead summary for Account Executives, without blocking the event loop.
         
         Args:
             state: Lead processing state
@@ -75,12 +366,13 @@ class LLMClient:
         try:
             # Prepare prompt
             prompt = self._build_summary_prompt(state, similar_accounts)
+            cache_key = _prompt_cache_key("summary", self.model, prompt)
+            cached = await llm_cache.get(cache_key)
+            if cached is not None:
+                return cached
             
             # Call OpenAI API
-            import openai
-            openai.api_key = self.api_key
-            
-            response = openai.ChatCompletion.create(
+            response = await _rate_limited_openai(lambda: self._get_async_client().chat.completions.create(
                 model=self.model,
                 messages=[
                     {"role": "system", "content": self._get_summary_rubric()},
@@ -88,51 +380,67 @@ class LLMClient:
                 ],
                 temperature=0.3,
                 max_tokens=800
-            )
+            ))
             
             summary = response.choices[0].message.content
+            await llm_cache.set(cache_key, summary)
             logger.info("LLM summary generated successfully")
             return summary
             
         except Exception as e:
-            logger.error(f"LLM summarization failed: {e}")
+            logger.error("LLM summarization failed: {}", e)
             return self._mock_summary(state, similar_accounts)
     
+    def _get_async_client(self):
+        """Get the AsyncOpenAI client over the running loop's pooled HTTP client."""
+        loop = asyncio.get_running_loop()
+        http_client = get_http_client("openai")
+        entry = self._async_clients.get(loop)
+        # Rebuild if the loop's pooled client was closed and replaced
+        if entry is None or entry[0] is not http_client:
+            # Forget clients whose event loop has gone away
+            for key in [key for key in list(self._async_clients) if key.is_closed()]:
+                self._async_clients.pop(key, None)
+            entry = (http_client, openai.AsyncOpenAI(api_key=self.api_key, http_client=http_client))
+            self._async_clients[loop] = entry
+        return entry[1]
+    
     def _get_scoring_rubric(self) -> str:
         """Get the scoring rubric for LLM."""
-        return """You are a Senior RevOps Analyst tasked with scoring B2B leads.
-
-SCORING CRITERIA:
-- Score range: 0.0 to 1.0
-- ICP industries: SaaS, FinTech, Ecommerce, HealthTech, EdTech
-- Minimum headcount: 20+ employees
-- Preferred titles: Director+, VP, C-level, Head of, Lead
-- Geographic focus: US, CA, UK, DE, FR, MA
-- Penalty for free email domains (gmail, yahoo, etc.)
-
-Return ONLY valid JSON in this format:
-{"score": 0.85, "reasons": ["ICP match: SaaS", "Seniority: Director", "Good headcount: 150"]}"""
+        return SCORING_RUBRIC
+    
+    def _get_batch_scoring_rubric(self) -> str:
+        """Get the scoring rubric for a numbered batch of leads."""
+        return BATCH_SCORING_RUBRIC
     
     def _get_summary_rubric(self) -> str:
         """Get the summary rubric for LLM."""
-        return """You are a Sales Operations Specialist creating lead summaries for Account Executives.
-
-Create a concise, actionable summary with 6-8 bullet points covering:
-- Who they are (company, role, industry)
-- Why now (timing signals, pain points)
-- Similar accounts (success stories, patterns)
-- Next best action (immediate next step)
-
-Keep it professional, data-driven, and sales-ready."""
+        return SUMMARY_RUBRIC
     
     def _build_scoring_prompt(self, state: Dict[str, Any], base_hint: float) -> str:
         """Build the scoring prompt for LLM."""
+        return f"""Score this lead based on the rubric:
+
+{self._build_lead_block(state, base_hint)}
+
+Score this lead and provide specific reasons:"""
+    
+    def _build_batch_scoring_prompt(self, states: List[Dict[str, Any]], base_hints: List[float]) -> str:
+        """Build one prompt scoring several leads, numbered [1]..[n]."""
+        blocks = "\n\n".join(
+            f"[{i}] {self._build_lead_block(state, base_hint)}"
+            for i, (state, base_hint) in enumerate(zip(states, base_hints), 1)
+        )
+        return f"""Score each lead based on the rubric. Return a JSON array [{{"id", "score", "reasons"}}, ...] with one entry per lead.
+
+{blocks}"""
+    
+    def _build_lead_block(self, state: Dict[str, Any], base_hint: float) -> str:
+        """Format one lead's data and rule-based hint for a scoring prompt."""
         normalized = state.get("normalized", {})
         enrichment = state.get("enrichment", {})
         
-        prompt = f"""Score this lead based on the rubric:
-
-LEAD DATA:
+        return f"""LEAD DATA:
 - Email: {normalized.get('email', 'N/A')}
 - Company: {normalized.get('company', 'N/A')}
 - Title: {normalized.get('title', 'N/A')}
@@ -145,11 +453,7 @@ ENRICHMENT:
 - Tech Stack: {enrichment.get('company', {}).get('tech', [])}
 - Seniority: {enrichment.get('person', {}).get('seniority', 'N/A')}
 
-Rule-based score hint: {base_hint:.3f}
-
-Score this lead and provide specific reasons:"""
-        
-        return prompt
+Rule-based score hint: {base_hint:.3f}"""
     
     def _build_summary_prompt(self, state: Dict[str, Any], similar_accounts: List[Dict[str, Any]]) -> str:
         """Build the summary prompt for LLM."""
@@ -157,10 +461,11 @@ Score this lead and provide specific reasons:"""
         enrichment = state.get("enrichment", {})
         score = state.get("score", 0)
         
-        # Format similar accounts
-        similar_text = ""
-        for i, account in enumerate(similar_accounts[:3], 1):
-            similar_text += f"{i}. {account['account']} - {account['outcome']}: {account['reason']}\n"
+        # Format similar accounts, one line each
+        similar_text = "".join(
+            f"{i}. {account['account']} - {account['outcome']}: {account['reason']}\n"
+            for i, account in enumerate(similar_accounts[:3], 1)
+        )
         
         prompt = f"""Create a sales-ready summary for this lead:
 
@@ -177,48 +482,93 @@ Generate a 6-8 bullet summary for the AE:"""
         
         return prompt
     
+    def _load_json(self, content: str, open_char: str, close_char: str) -> Any:
+        """
+        Parse model output as JSON.
+        
+        The rubric asks for JSON only, so the whole content is tried first;
+        if the model wrapped it in prose, the outermost open_char..close_char
+        span is parsed instead. Raises ValueError if neither parses.
+        """
+        try:
+            return orjson.loads(content)
+        except orjson.JSONDecodeError:
+            start = content.find(open_char)
+            end = content.rfind(close_char) + 1
+            if start == -1 or end <= start:
+                raise
+            return orjson.loads(content[start:end])
+    
     def _parse_scoring_response(self, content: str) -> Dict[str, Any]:
         """Parse the LLM scoring response."""
         try:
-            # Try to extract JSON from response
-            if "{" in content and "}" in content:
-                start = content.find("{")
-                end = content.rfind("}") + 1
-                json_str = content[start:end]
-                result = json.loads(json_str)
-                
-                # Validate response format
-                if "score" in result and "reasons" in result:
-                    score = float(result["score"])
-                    reasons = result["reasons"] if isinstance(result["reasons"], list) else [str(result["reasons"])]
-                    return {"score": score, "reasons": reasons}
+            try:
+                result = self._load_json(content, "{", "}")
+            except ValueError:
+                result = None
+            
+            # Validate response format
+            if isinstance(result, dict) and "score" in result and "reasons" in result:
+                score = float(result["score"])
+                reasons = result["reasons"] if isinstance(result["reasons"], list) else [str(result["reasons"])]
+                return {"score": score, "reasons": reasons, "parsed": True}
             
             # Fallback parsing
             logger.warning("Could not parse LLM response as JSON, using fallback")
-            return {"score": 0.5, "reasons": ["LLM response parsing failed"]}
+            return {"score": 0.5, "reasons": ["LLM response parsing failed"], "parsed": False}
             
         except Exception as e:
-            logger.error(f"Failed to parse LLM response: {e}")
-            return {"score": 0.5, "reasons": ["Response parsing error"]}
+            logger.error("Failed to parse LLM response: {}", e)
+            return {"score": 0.5, "reasons": ["Response parsing error"], "parsed": False}
+    
+    def _parse_batch_scoring_response(self, content: str, count: int) -> List[Optional[Tuple[float, List[str]]]]:
+        """
+        Parse a batched scoring response into input order.
+        
+        Args:
+            content: Model output containing a JSON array of {id, score, reasons}
+            count: Number of leads in the batch
+        
+        Returns:
+            One (score, reasons) per lead, or None where the lead's entry is
+            missing or malformed
+        """
+        results: List[Optional[Tuple[float, List[str]]]] = [None] * count
+        try:
+            entries = self._load_json(content, "[", "]")
+        except ValueError as e:
+            logger.warning("Could not parse batched LLM response as JSON: {}", e)
+            return results
+        
+        for entry in entries if isinstance(entries, list) else []:
+            try:
+                index = int(entry["id"]) - 1
+                if 0 <= index < count:
+                    reasons = entry["reasons"] if isinstance(entry["reasons"], list) else [str(entry["reasons"])]
+                    results[index] = (float(entry["score"]), reasons)
+            except (KeyError, TypeError, ValueError):
+                continue
+        return results
     
     def _mock_scoring(self, state: Dict[str, Any], base_hint: float) -> Tuple[float, List[str]]:
         """Mock scoring for testing/fallback."""
-        normalized = state.get("normalized", {})
-        enrichment = state.get("enrichment", {})
+        company = state.get("enrichment", {}).get("company", {})
+        title = (state.get("normalized", {}).get("title") or "").lower()
         
         reasons = []
         score = base_hint
         
         # Add mock reasons based on data
-        if enrichment.get("company", {}).get("industry"):
-            reasons.append(f"ICP match: {enrichment['company']['industry']}")
+        industry = company.get("industry")
+        if industry:
+            reasons.append(f"ICP match: {industry}")
             score += 0.1
         
-        if enrichment.get("company", {}).get("employees", 0) >= 100:
+        if company.get("employees", 0) >= 100:
             reasons.append("Enterprise size company")
             score += 0.1
         
-        if any(title in (normalized.get("title") or "").lower() for title in ["director", "vp", "cxo"]):
+        if any(keyword in title for keyword in SENIOR_TITLE_KEYWORDS):
             reasons.append("Senior decision maker")
             score += 0.1
         
@@ -252,6 +602,11 @@ Generate a 6-8 bullet summary for the AE:"""
 # Global LLM client instance
 llm_client = LLMClient()
 
+def warm_llm_client():
+    """Build the async client at startup rather than on the first lead."""
+    if llm_client.api_key:
+        llm_client._get_async_client()
+
 def score_lead_with_rubric(state: Dict[str, Any], base_hint: float = 0.0) -> Tuple[float, List[str]]:
     """Score lead using the global LLM client."""
     return llm_client.score_lead_with_rubric(state, base_hint)
@@ -259,3 +614,51 @@ def score_lead_with_rubric(state: Dict[str, Any], base_hint: float = 0.0) -> Tup
 def summarize_for_ae(state: Dict[str, Any], similar_accounts: List[Dict[str, Any]]) -> str:
     """Generate summary using the global LLM client."""
     return llm_client.summarize_for_ae(state, similar_accounts)
+
+async def _score_batch(items: List[Tuple[Dict[str, Any], float]]) -> List[Tuple[float, List[str]]]:
+    """Score a batch of (state, base_hint) pairs in one numbered LLM prompt."""
+    return await llm_client.score_leads_batch([state for state, _ in items], [base_hint for _, base_hint in items])
+
+# Global scoring batcher; flushed on application shutdown
+llm_batcher = AsyncBatcher(_score_batch, max_batch_size=LLM_BATCH_SIZE, max_delay=LLM_BATCH_DELAY)
+
+async def score_lead_with_rubric_async(state: Dict[str, Any], base_hint: float = 0.0) -> Tuple[float, List[str]]:
+    """Score lead asynchronously using the global LLM client, batched with concurrent leads."""
+    if not llm_client.api_key:
+        # Mock scoring is local; batching would only add delay
+        return await llm_client.score_lead_with_rubric_async(state, base_hint)
+    return await llm_batcher.process_batched((state, base_hint))
+
+async def summarize_for_ae_async(state: Dict[str, Any], similar_accounts: List[Dict[str, Any]]) -> str:
+    """Generate summary asynchronously using the global LLM client."""
+    return await llm_client.summarize_for_ae_async(state, similar_accounts)
+
+async def embed_texts(texts: List[str]) -> List[List[float]]:
+    """
+    Embed texts with the OpenAI embeddings API.
+    
+    Args:
+        texts: Texts to embed; sent EMBEDDING_BATCH_SIZE per request
+    
+    Returns:
+        One embedding per text, in input order
+    """
+    client = llm_client._get_async_client()
+    responses = await asyncio.gather(*[
+        _rate_limited_openai(lambda chunk=texts[i:i + EMBEDDING_BATCH_SIZE]: client.embeddings.create(model=EMBEDDING_MODEL, input=chunk))
+        for i in range(0, len(texts), EMBEDDING_BATCH_SIZE)
+    ])
+    return [item.embedding for response in responses for item in sorted(response.data, key=lambda item: item.index)]
+
+# Global embedding batcher; flushed on application shutdown
+embedding_batcher = AsyncBatcher(embed_texts, max_batch_size=EMBEDDING_BATCH_SIZE, max_delay=LLM_BATCH_DELAY)
+
+async def embed_text_async(text: str) -> Optional[List[float]]:
+    """Embed one text, batched with concurrent callers; None in mock mode or on failure."""
+    if not llm_client.api_key:
+        return None
+    try:
+        return await embedding_batcher.process_batched(text)
+    except Exception as e:
+        logger.error("Embedding failed: {}", e)
+        return None
@@ -1,6 +1,21 @@
 import os
-from typing import List, Dict, Any
+import asyncio
+import secrets
+from typing import List, Dict, Any, Optional, Tuple
 from loguru import logger
+from tools.llm import EMBEDDING_BATCH_SIZE, embed_text_async, embed_texts, llm_client
+from tools.threads import run_sync
+
+# OpenAI embedding dimension (text-embedding-3-small); the stub vector used
+# without an OpenAI key only fills the first few slots
+EMBEDDING_DIM = 1536
+_FEATURE_SLOTS = 4
+_ZERO_TAIL = [0.0] * (EMBEDDING_DIM - _FEATURE_SLOTS)
+# Leads with fewer known features (industry, headcount, tech, country) skip
+# the similarity query, since it would only return noise
+MIN_QUERY_FEATURES = 2
+# Vectors per upsert request (Pinecone recommends batches of about 100)
+PINECONE_UPSERT_BATCH_SIZE = int(os.getenv("PINECONE_UPSERT_BATCH_SIZE", "100"))
 
 class PineconeStore:
     """Pinecone vector store for finding similar accounts and outcomes."""
@@ -15,19 +30,22 @@ class PineconeStore:
                 import pinecone
                 pinecone.init(api_key=self.api_key, environment="us-west1-gcp")
                 self.index = pinecone.Index(self.index_name)
-                logger.info(f"Pinecone index '{self.index_name}' connected successfully")
+                logger.info("Pinecone index '{}' connected successfully", self.index_name)
             except Exception as e:
-                logger.error(f"Pinecone connection failed: {e}")
+                logger.error("Pinecone connection failed: {}", e)
                 self.index = None
         else:
             logger.warning("No Pinecone API key provided, using mock mode")
     
-    def similar_accounts(self, state: Dict[str, Any]) -> List[Dict[str, Any]]:
+    def similar_accounts(self, state: Dict[str, Any], vector: Optional[List[float]] = None) -> List[Dict[str, Any]]:
         """
         Find similar accounts based on company characteristics.
         
         Args:
             state: Lead processing state
+            vector: Precomputed embedding of the company features (see
+                embed_account_features); the stub vector is used if omitted
+                in keyless mode
             
         Returns:
             List of similar accounts with outcomes
@@ -37,18 +55,36 @@ class PineconeStore:
             return self._mock_similar_accounts(state)
         
         try:
-            # Extract company features for vector search
-            company_features = self._extract_company_features(state)
+            features = self._extract_company_features(state)
+            if not self._has_enough_features(features):
+                logger.info("Insufficient features, skipping Pinecone")
+                return []
             
-            # Create embedding vector (simplified - in production, use proper embedding model)
-            vector = self._create_embedding_vector(company_features)
+            if vector is None:
+                # Stub vectors are not comparable with the real embeddings
+                # in a keyed index, so only keyless mode falls back to them
+                if llm_client.api_key:
+                    logger.warning("No embedding for lead, skipping Pinecone")
+                    return []
+                vector = self._create_embedding_vector(features)
             
-            # Query Pinecone
+            # Query Pinecone, letting the server prune to the lead's industry/country;
+            # widen to the whole index if nothing matches (e.g. older vectors)
+            metadata_filter = self._metadata_filter(features)
             query_response = self.index.query(
                 vector=vector,
                 top_k=3,
+                filter=metadata_filter or None,
+                include_values=False,
                 include_metadata=True
             )
+            if metadata_filter and not query_response.matches:
+                query_response = self.index.query(
+                    vector=vector,
+                    top_k=3,
+                    include_values=False,
+                    include_metadata=True
+                )
             
             # Process results
             similar_accounts = []
@@ -62,52 +98,70 @@ class PineconeStore:
                 }
                 similar_accounts.append(account_data)
             
-            logger.info(f"Found {len(similar_accounts)} similar accounts")
+            logger.info("Found {} similar accounts", len(similar_accounts))
             return similar_accounts
             
         except Exception as e:
-            logger.error(f"Pinecone search failed: {e}")
+            logger.error("Pinecone search failed: {}", e)
             return self._mock_similar_accounts(state)
     
     def _extract_company_features(self, state: Dict[str, Any]) -> Dict[str, Any]:
         """Extract relevant company features for similarity matching."""
-        enrichment = state.get("enrichment", {})
-        company = enrichment.get("company", {})
+        company = (state.get("enrichment") or {}).get("company") or {}
+        norm = state.get("normalized") or {}
         
         features = {
-            "industry": company.get("industry", "").lower(),
-            "headcount": company.get("employees", 0),
-            "tech_stack": company.get("tech", []),
-            "country": state.get("normalized", {}).get("country", "").upper()
+            "industry": (company.get("industry") or "").lower(),
+            "headcount": company.get("employees") or 0,
+            "tech_stack": company.get("tech") or [],
+            "country": (norm.get("country") or "").upper()
         }
         
         return features
     
+    def _has_enough_features(self, features: Dict[str, Any]) -> bool:
+        """Whether enough company features are known for a meaningful similarity query."""
+        populated = sum((
+            bool(features["industry"]),
+            features["headcount"] > 0,
+            bool(features["tech_stack"]),
+            bool(features["country"])
+        ))
+        return populated >= MIN_QUERY_FEATURES
+    
+    def _metadata_filter(self, features: Dict[str, Any]) -> Dict[str, Any]:
+        """Build a Pinecone metadata filter on the normalized industry and country."""
+        metadata_filter = {}
+        if features["industry"]:
+            metadata_filter["industry_key"] = {"$eq": features["industry"]}
+        if features["country"]:
+            metadata_filter["country"] = {"$eq": features["country"]}
+        return metadata_filter
+    
+    def _features_text(self, features: Dict[str, Any]) -> str:
+        """Describe company features as a sentence for the embedding model."""
+        tech = ", ".join(features["tech_stack"]) or "unknown tech"
+        return f"{features['industry'] or 'unknown'} industry, {features['headcount']} employees, {tech}, {features['country'] or 'unknown country'}"
+    
     def _create_embedding_vector(self, features: Dict[str, Any]) -> List[float]:
         """
-        Create a simple embedding vector from company features.
-        In production, this would use a proper embedding model.
+        Create a stub embedding vector from company features.
+        Used only when no OpenAI key is configured.
         """
-        # This is a simplified mock embedding
-        # In reality, you'd use OpenAI embeddings or similar
-        vector = [0.0] * 1536  # OpenAI embedding dimension
-        
-        # Simple feature encoding (very basic)
-        if features["industry"]:
-            vector[0] = 0.1
-        if features["headcount"] > 100:
-            vector[1] = 0.2
-        if features["tech_stack"]:
-            vector[2] = 0.1
-        if features["country"] == "US":
-            vector[3] = 0.1
-            
-        return vector
+        # Simple feature encoding (very basic), padded with the shared zero
+        # tail in one list concatenation
+        return [
+            0.1 if features["industry"] else 0.0,
+            0.2 if features["headcount"] > 100 else 0.0,
+            0.1 if features["tech_stack"] else 0.0,
+            0.1 if features["country"] == "US" else 0.0
+        ] + _ZERO_TAIL
     
     def _mock_similar_accounts(self, state: Dict[str, Any]) -> List[Dict[str, Any]]:
         """Generate mock similar accounts for testing/fallback."""
-        industry = state.get("enrichment", {}).get("company", {}).get("industry", "Technology")
-        headcount = state.get("enrichment", {}).get("company", {}).get("employees", 100)
+        company = (state.get("enrichment") or {}).get("company") or {}
+        industry = company.get("industry") or "Technology"
+        headcount = company.get("employees") or 100
         
         mock_accounts = [
             {
@@ -153,7 +207,7 @@ class PineconeStore:
         
         return mock_accounts
     
-    def store_account_outcome(self, company_data: Dict[str, Any], outcome: str, metadata: Dict[str, Any] = None):
+    def store_account_outcome(self, company_data: Dict[str, Any], outcome: str, metadata: Dict[str, Any] = None) -> bool:
         """
         Store account outcome for future similarity matching.
         
@@ -161,55 +215,118 @@ class PineconeStore:
             company_data: Company information
             outcome: Deal outcome (Won/Lost/No Decision)
             metadata: Additional metadata
+        
+        Returns:
+            True if the outcome was stored
+        """
+        return self.store_account_outcomes([(company_data, outcome, metadata)]) == 1
+    
+    def store_account_outcomes(self, records: List[Tuple[Dict[str, Any], str, Optional[Dict[str, Any]]]]) -> int:
+        """
+        Store many account outcomes, e.g. for a CRM backfill.
+        
+        All records are embedded together (one embeddings request per
+        EMBEDDING_BATCH_SIZE texts) and upserted PINECONE_UPSERT_BATCH_SIZE
+        vectors at a time. Records whose embedding request fails are skipped
+        rather than stored with stub vectors, which would not be comparable
+        with the real embeddings in the index.
+        
+        Args:
+            records: (company_data, outcome, metadata) tuples; metadata may be None
+        
+        Returns:
+            Number of outcomes stored
         """
         if not self.index:
-            logger.info("Mock mode: would store account outcome")
-            return
+            logger.info("Mock mode: would store {} account outcomes", len(records))
+            return 0
         
         try:
-            # Create embedding vector
-            features = {
-                "industry": company_data.get("industry", "").lower(),
-                "headcount": company_data.get("employees", 0),
-                "tech_stack": company_data.get("tech", []),
-                "country": company_data.get("country", "").upper()
-            }
-            
-            vector = self._create_embedding_vector(features)
-            
-            # Prepare metadata
-            vector_metadata = {
-                "company_name": company_data.get("name", "Unknown"),
-                "industry": company_data.get("industry", ""),
-                "employees": company_data.get("employees", 0),
-                "outcome": outcome,
-                "timestamp": "now"
-            }
+            # Create embedding vectors
+            features_list = [
+                {
+                    "industry": (company_data.get("industry") or "").lower(),
+                    "headcount": company_data.get("employees") or 0,
+                    "tech_stack": company_data.get("tech") or [],
+                    "country": (company_data.get("country") or "").upper()
+                }
+                for company_data, _, _ in records
+            ]
             
-            if metadata:
-                vector_metadata.update(metadata)
+            if llm_client.api_key:
+                vectors = run_sync(self._embed_features(features_list))
+            else:
+                # Keyless mode: the index only ever holds stub vectors
+                vectors = [self._create_embedding_vector(features) for features in features_list]
             
-            # Generate unique ID
-            import uuid
-            vector_id = str(uuid.uuid4())
+            upserts = []
+            for (company_data, outcome, metadata), features, vector in zip(records, features_list, vectors):
+                if vector is None:
+                    continue
+                
+                # Prepare metadata
+                vector_metadata = {
+                    "company_name": company_data.get("name", "Unknown"),
+                    "industry": company_data.get("industry") or "",
+                    "employees": company_data.get("employees") or 0,
+                    # Normalized like the query features, for server-side filtering
+                    "industry_key": features["industry"],
+                    "country": features["country"],
+                    "outcome": outcome,
+                    "timestamp": "now"
+                }
+                
+                if metadata:
+                    vector_metadata.update(metadata)
+                
+                upserts.append((secrets.token_hex(16), vector, vector_metadata))
             
             # Upsert to Pinecone
-            self.index.upsert(
-                vectors=[(vector_id, vector, vector_metadata)]
-            )
+            for i in range(0, len(upserts), PINECONE_UPSERT_BATCH_SIZE):
+                self.index.upsert(vectors=upserts[i:i + PINECONE_UPSERT_BATCH_SIZE])
             
-            logger.info(f"Stored account outcome for {company_data.get('name', 'Unknown')}")
+            logger.info("Stored {} account outcomes", len(upserts))
+            return len(upserts)
             
         except Exception as e:
-            logger.error(f"Failed to store account outcome: {e}")
+            logger.error("Failed to store account outcomes: {}", e)
+            return 0
+    
+    async def _embed_features(self, features_list: List[Dict[str, Any]]) -> List[Optional[List[float]]]:
+        """Embed features EMBEDDING_BATCH_SIZE at a time; None for records in a chunk whose request failed."""
+        texts = [self._features_text(features) for features in features_list]
+        chunks = [texts[i:i + EMBEDDING_BATCH_SIZE] for i in range(0, len(texts), EMBEDDING_BATCH_SIZE)]
+        results = await asyncio.gather(*[embed_texts(chunk) for chunk in chunks], return_exceptions=True)
+        
+        vectors = []
+        for chunk, result in zip(chunks, results):
+            if isinstance(result, Exception):
+                logger.error("Embedding failed, skipping {} account outcomes: {}", len(chunk), result)
+                vectors.extend([None] * len(chunk))
+            else:
+                vectors.extend(result)
+        return vectors
 
 # Global Pinecone store instance
 pinecone_store = PineconeStore()
 
-def similar_accounts(state: Dict[str, Any]) -> List[Dict[str, Any]]:
+def similar_accounts(state: Dict[str, Any], vector: Optional[List[float]] = None) -> List[Dict[str, Any]]:
     """Find similar accounts using the global Pinecone store."""
-    return pinecone_store.similar_accounts(state)
+    return pinecone_store.similar_accounts(state, vector)
+
+async def embed_account_features(state: Dict[str, Any]) -> Optional[List[float]]:
+    """Embed the lead's company features for the similarity query; None when Pinecone or OpenAI is not configured."""
+    if not pinecone_store.index:
+        return None
+    features = pinecone_store._extract_company_features(state)
+    if not pinecone_store._has_enough_features(features):
+        return None
+    return await embed_text_async(pinecone_store._features_text(features))
 
-def store_account_outcome(company_data: Dict[str, Any], outcome: str, metadata: Dict[str, Any] = None):
+def store_account_outcome(company_data: Dict[str, Any], outcome: str, metadata: Dict[str, Any] = None) -> bool:
     """Store account outcome using the global Pinecone store."""
-    pinecone_store.store_account_outcome(company_data, outcome, metadata)
+    return pinecone_store.store_account_outcome(company_data, outcome, metadata)
+
+def store_account_outcomes(records: List[Tuple[Dict[str, Any], str, Optional[Dict[str, Any]]]]) -> int:
+    """Store many account outcomes using the global Pinecone store."""
+    return pinecone_store.store_account_outcomes(records)
@@ -0,0 +1,92 @@
+import time
+import asyncio
+from typing import Any, Awaitable, Callable, Mapping, Optional
+from loguru import logger
+
+# How long a rate-limit backoff keeps the reduced rate before restoring it
+RATE_RECOVERY_SECONDS = 60.0
+
+class RateLimited(Exception):
+    """Raised by a limited call when the vendor answered 429."""
+    
+    def __init__(self, retry_after: float):
+        super().__init__(f"Rate limited, retry after {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+def retry_after_seconds(headers: Optional[Mapping[str, str]], default: float = 1.0) -> float:
+    """Read a Retry-After header (in seconds), falling back to `default`."""
+    try:
+        return max(float((headers or {}).get("retry-after", default)), 0.0)
+    except (TypeError, ValueError):
+        return default
+
+class AdaptiveLimiter:
+    """
+    Token bucket limiting calls to a vendor to `max_rate` per minute.
+    
+    Bursts of up to a tenth of the per-minute quota go out immediately. On a
+    429 the rate is halved and every caller waits out the vendor's
+    Retry-After; the full rate is restored once RATE_RECOVERY_SECONDS pass
+    without another 429. Holds no loop-bound state, so one limiter can be
+    shared by every event loop in the process.
+    """
+    
+    def __init__(self, name: str, max_rate: float, min_rate: float = 1.0):
+        self.name = name
+        self.max_rate = max_rate
+        self.min_rate = min(min_rate, max_rate)
+        self.rate = max_rate
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._reduced_until = 0.0
+    
+    @property
+    def burst(self) -> float:
+        """Max calls that may start back to back at the current rate."""
+        return max(self.rate / 10, 1.0)
+    
+    async def acquire(self):
+        """Wait for a call slot; slots are reserved in arrival order."""
+        now = time.monotonic()
+        if self.rate < self.max_rate and now >= self._reduced_until:
+            self.rate = self.max_rate
+            logger.info("{} rate limit restored to {}/min", self.name, self.rate)
+        
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate / 60)
+        self._updated = now
+        # A negative balance is a queue of reserved slots ahead of this caller
+        self._tokens -= 1
+        wait = max(-self._tokens * 60 / self.rate, self._paused_until - now)
+        if wait > 0:
+            await asyncio.sleep(wait)
+    
+    def backoff(self, retry_after: float):
+        """Halve the rate and hold all callers for `retry_after` seconds."""
+        now = time.monotonic()
+        self.rate = max(self.rate / 2, self.min_rate)
+        self._tokens = min(self._tokens, 0.0)
+        self._paused_until = max(self._paused_until, now + retry_after)
+        self._reduced_until = now + retry_after + RATE_RECOVERY_SECONDS
+        logger.warning("{} rate limited; pausing {:.1f}s at {}/min", self.name, retry_after, self.rate)
+    
+    async def call(self, func: Callable[[], Awaitable[Any]], retries: int = 1) -> Any:
+        """
+        Run `func` within the rate limit, retrying after a RateLimited backoff.
+        
+        Args:
+            func: Zero-argument coroutine function making one vendor call;
+                raises RateLimited on a 429
+            retries: Extra attempts after a rate-limit response
+        
+        Returns:
+            The call's result
+        """
+        for attempt in range(retries + 1):
+            await self.acquire()
+            try:
+                return await func()
+            except RateLimited as e:
+                self.backoff(e.retry_after)
+                if attempt == retries:
+                    raise
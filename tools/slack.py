@@ -1,6 +1,41 @@
 import os
-from typing import Dict, Any, Optional
+import asyncio
+import orjson
+from typing import Dict, Any, List, Optional
 from loguru import logger
+from tools.batching import AsyncBatcher
+from tools.http_clients import configure_http_client, get_http_client
+from tools.ratelimit import AdaptiveLimiter, RateLimited, retry_after_seconds
+from tools.threads import run_sync, vendor_semaphore
+
+# Leads at or above this score get an immediate alert; the rest go out in digests
+HIGH_PRIORITY_SCORE = 0.8
+SLACK_DIGEST_SIZE = int(os.getenv("SLACK_DIGEST_SIZE", "10"))
+SLACK_DIGEST_WAIT = float(os.getenv("SLACK_DIGEST_WAIT", "1.0"))
+# Web API calls per minute; halved while Slack returns 429s
+SLACK_RPM = float(os.getenv("SLACK_RPM", "50"))
+slack_limiter = AdaptiveLimiter("slack", SLACK_RPM)
+
+# (emoji, priority) by score decile: HIGH from 0.8, MEDIUM from 0.6, else LOW
+_PRIORITY_LUT = (("📧", "LOW"),) * 6 + (("✅", "MEDIUM"),) * 2 + (("🚀", "HIGH"),) * 3
+
+# Static Block Kit blocks, built once and shared by every message (messages
+# are only serialized, never mutated)
+_LEAD_HEADERS = {
+    emoji: {"type": "header", "text": {"type": "plain_text", "text": f"{emoji} New Lead Assigned"}}
+    for emoji in ("🚀", "✅", "📧")
+}
+_HIGH_PRIORITY_HEADER = {"type": "header", "text": {"type": "plain_text", "text": "🚨 HIGH PRIORITY LEAD ALERT"}}
+_HIGH_PRIORITY_MENTION = {
+    "type": "section",
+    "text": {"type": "mrkdwn", "text": "*<here>* New high-priority lead requires immediate attention!"}
+}
+_HIGH_PRIORITY_NEXT_ACTION = {
+    "type": "section",
+    "text": {"type": "mrkdwn", "text": "*Next Action:* Schedule discovery call within 2 hours"}
+}
+_VIEW_IN_CRM_TEXT = {"type": "plain_text", "text": "View in CRM"}
+_MARK_CONTACTED_TEXT = {"type": "plain_text", "text": "Mark Contacted"}
 
 class SlackNotifier:
     """Slack integration for sending lead notifications to sales teams."""
@@ -11,8 +46,30 @@ class SlackNotifier:
         
         if not self.token:
             logger.warning("No Slack token provided, using mock mode")
+        else:
+            # Web API calls go over the pooled async HTTP client instead of a blocking WebClient
+            configure_http_client(
+                "slack",
+                base_url="https://slack.com/api",
+                headers={
+                    "Authorization": f"Bearer {self.token}",
+                    "Content-Type": "application/json; charset=utf-8"
+                }
+            )
     
     def send_lead_notification(self, state: Dict[str, Any], channel: Optional[str] = None) -> Optional[str]:
+        """Send lead notification to Slack channel (for synchronous callers)."""
+        return run_sync(self.send_lead_notification_async(state, channel))
+    
+    def send_high_priority_alert(self, state: Dict[str, Any], channel: Optional[str] = None) -> Optional[str]:
+        """Send high-priority lead alert to dedicated channel (for synchronous callers)."""
+        return run_sync(self.send_high_priority_alert_async(state, channel))
+    
+    def send_lead_digest(self, states: List[Dict[str, Any]], channel: Optional[str] = None) -> Optional[str]:
+        """Send a single Slack message summarizing several leads (for synchronous callers)."""
+        return run_sync(self.send_lead_digest_async(states, channel))
+    
+    async def send_lead_notification_async(self, state: Dict[str, Any], channel: Optional[str] = None) -> Optional[str]:
         """
         Send lead notification to Slack channel.
         
@@ -28,33 +85,16 @@ class SlackNotifier:
             return "mock_timestamp_123"
         
         try:
-            import slack_sdk
-            from slack_sdk.web import WebClient
-            from slack_sdk.errors import SlackApiError
-            
-            client = WebClient(token=self.token)
             target_channel = channel or self.default_channel
-            
-            # Build message
-            message = self._build_lead_message(state)
-            
-            # Send message
-            response = client.chat_postMessage(
-                channel=target_channel,
-                text=message["text"],
-                blocks=message["blocks"]
-            )
-            
-            message_ts = response["ts"]
-            logger.info(f"Slack notification sent to {target_channel}: {message_ts}")
-            
+            message_ts = await self._post_message(target_channel, self._build_lead_message(state))
+            logger.info("Slack notification sent to {}: {}", target_channel, message_ts)
             return message_ts
             
         except Exception as e:
-            logger.error(f"Slack notification failed: {e}")
+            logger.error("Slack notification failed: {}", e)
             return None
     
-    def send_high_priority_alert(self, state: Dict[str, Any], channel: Optional[str] = None) -> Optional[str]:
+    async def send_high_priority_alert_async(self, state: Dict[str, Any], channel: Optional[str] = None) -> Optional[str]:
         """
         Send high-priority lead alert to dedicated channel.
         
@@ -70,31 +110,113 @@ class SlackNotifier:
             return "mock_alert_timestamp_456"
         
         try:
-            import slack_sdk
-            from slack_sdk.web import WebClient
-            
-            client = WebClient(token=self.token)
             target_channel = channel or "#high-priority-leads"
+            message_ts = await self._post_message(target_channel, self._build_high_priority_message(state))
+            logger.info("High-priority alert sent to {}: {}", target_channel, message_ts)
+            return message_ts
             
-            # Build high-priority message
-            message = self._build_high_priority_message(state)
-            
-            # Send with @here mention
-            response = client.chat_postMessage(
-                channel=target_channel,
-                text=message["text"],
-                blocks=message["blocks"]
-            )
-            
-            message_ts = response["ts"]
-            logger.info(f"High-priority alert sent to {target_channel}: {message_ts}")
+        except Exception as e:
+            logger.error("High-priority alert failed: {}", e)
+            return None
+    
+    async def send_lead_digest_async(self, states: List[Dict[str, Any]], channel: Optional[str] = None) -> Optional[str]:
+        """
+        Send a single Slack message summarizing several leads.
+        
+        Args:
+            states: Lead processing states
+            channel: Slack channel (optional, uses default if not specified)
             
+        Returns:
+            Slack message timestamp or None if failed
+        """
+        if not self.token:
+            logger.info("Mock mode: would send Slack digest of {} leads", len(states))
+            return "mock_digest_timestamp_789"
+        
+        try:
+            target_channel = channel or self.default_channel
+            message_ts = await self._post_message(target_channel, self._build_digest_message(states))
+            logger.info("Slack digest of {} leads sent to {}: {}", len(states), target_channel, message_ts)
             return message_ts
             
         except Exception as e:
-            logger.error(f"High-priority alert failed: {e}")
+            logger.error("Slack digest failed: {}", e)
             return None
     
+    async def send_lead_notifications(self, states: List[Dict[str, Any]], channel: Optional[str] = None) -> List[Optional[str]]:
+        """
+        Send one notification per lead concurrently, bounded by SLACK_CONCURRENCY.
+        
+        Args:
+            states: Lead processing states
+            channel: Slack channel (optional, uses default if not specified)
+            
+        Returns:
+            Slack message timestamp (or None if failed) per lead
+        """
+        async def send(state: Dict[str, Any]) -> Optional[str]:
+            async with vendor_semaphore("slack"):
+                return await self.send_lead_notification_async(state, channel)
+        
+        return await asyncio.gather(*[send(state) for state in states])
+    
+    async def _call(self, method: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Call a Slack Web API method, raising on HTTP or API errors."""
+        async def attempt():
+            response = await get_http_client("slack").post(method, content=orjson.dumps(payload))
+            if response.status_code == 429:
+                raise RateLimited(retry_after_seconds(response.headers))
+            response.raise_for_status()
+            return orjson.loads(response.content)
+        
+        data = await slack_limiter.call(attempt)
+        if not data.get("ok"):
+            raise RuntimeError(f"Slack API error: {data.get('error', 'unknown')}")
+        return data
+    
+    async def _post_message(self, channel: str, message: Dict[str, Any]) -> str:
+        """Post a built message to a channel and return its timestamp."""
+        data = await self._call("chat.postMessage", {"channel": channel, "text": message["text"], "blocks": message["blocks"]})
+        return data["ts"]
+    
+    def _score_priority(self, score: float):
+        """Map a lead score to its (emoji, priority) label."""
+        return _PRIORITY_LUT[min(max(int(score * 10), 0), 10)]
+    
+    def _build_digest_message(self, states: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Build Slack message listing several leads, one line each."""
+        text = f"📬 {len(states)} new leads"
+        
+        lines = []
+        for state in states:
+            normalized = state.get("normalized", {})
+            score = state.get("score", 0)
+            emoji, priority = self._score_priority(score)
+            lines.append(
+                f"{emoji} *{normalized.get('full_name', 'Unknown')}* ({normalized.get('company', 'Unknown')}) "
+                f"- {score:.2f} {priority} → {state.get('owner') or 'Unassigned'}"
+            )
+        
+        blocks = [
+            {
+                "type": "header",
+                "text": {
+                    "type": "plain_text",
+                    "text": text
+                }
+            },
+            {
+                "type": "section",
+                "text": {
+                    "type": "mrkdwn",
+                    "text": "\n".join(lines)
+                }
+            }
+        ]
+        
+        return {"text": text, "blocks": blocks}
+    
     def _build_lead_message(self, state: Dict[str, Any]) -> Dict[str, Any]:
         """Build Slack message for lead notification."""
         normalized = state.get("normalized", {})
@@ -103,28 +225,14 @@ class SlackNotifier:
         owner = state.get("owner", "Unassigned")
         
         # Determine emoji based on score
-        if score >= 0.8:
-            emoji = "🚀"
-            priority = "HIGH"
-        elif score >= 0.6:
-            emoji = "✅"
-            priority = "MEDIUM"
-        else:
-            emoji = "📧"
-            priority = "LOW"
+        emoji, priority = self._score_priority(score)
         
         # Build text summary
         text = f"{emoji} New Lead: {normalized.get('full_name', 'Unknown')} from {normalized.get('company', 'Unknown')}"
         
         # Build rich blocks
         blocks = [
-            {
-                "type": "header",
-                "text": {
-                    "type": "plain_text",
-                    "text": f"{emoji} New Lead Assigned"
-                }
-            },
+            _LEAD_HEADERS[emoji],
             {
                 "type": "section",
                 "fields": [
@@ -198,19 +306,13 @@ class SlackNotifier:
             "elements": [
                 {
                     "type": "button",
-                    "text": {
-                        "type": "plain_text",
-                        "text": "View in CRM"
-                    },
+                    "text": _VIEW_IN_CRM_TEXT,
                     "url": f"https://app.hubspot.com/contacts/{state.get('crm_record_id', '')}",
                     "style": "primary"
                 },
                 {
                     "type": "button",
-                    "text": {
-                        "type": "plain_text",
-                        "text": "Mark Contacted"
-                    },
+                    "text": _MARK_CONTACTED_TEXT,
                     "value": f"contacted_{state.get('lead_id', '')}",
                     "action_id": "mark_contacted"
                 }
@@ -227,20 +329,8 @@ class SlackNotifier:
         text = f"🚨 HIGH PRIORITY LEAD: {normalized.get('full_name', 'Unknown')} from {normalized.get('company', 'Unknown')} (Score: {score:.2f})"
         
         blocks = [
-            {
-                "type": "header",
-                "text": {
-                    "type": "plain_text",
-                    "text": "🚨 HIGH PRIORITY LEAD ALERT"
-                }
-            },
-            {
-                "type": "section",
-                "text": {
-                    "type": "mrkdwn",
-                    "text": f"*<here>* New high-priority lead requires immediate attention!"
-                }
-            },
+            _HIGH_PRIORITY_HEADER,
+            _HIGH_PRIORITY_MENTION,
             {
                 "type": "section",
                 "fields": [
@@ -262,13 +352,7 @@ class SlackNotifier:
                     }
                 ]
             },
-            {
-                "type": "section",
-                "text": {
-                    "type": "mrkdwn",
-                    "text": "*Next Action:* Schedule discovery call within 2 hours"
-                }
-            }
+            _HIGH_PRIORITY_NEXT_ACTION
         ]
         
         return {"text": text, "blocks": blocks}
@@ -290,22 +374,12 @@ class SlackNotifier:
             return True
         
         try:
-            import slack_sdk
-            from slack_sdk.web import WebClient
-            
-            client = WebClient(token=self.token)
-            
-            response = client.chat_update(
-                channel=channel,
-                ts=timestamp,
-                text=new_text
-            )
-            
-            logger.info(f"Slack message updated: {timestamp}")
+            run_sync(self._call("chat.update", {"channel": channel, "ts": timestamp, "text": new_text}))
+            logger.info("Slack message updated: {}", timestamp)
             return True
             
         except Exception as e:
-            logger.error(f"Slack message update failed: {e}")
+            logger.error("Slack message update failed: {}", e)
             return False
 
 # Global Slack notifier instance
@@ -318,3 +392,54 @@ def send_lead_notification(state: Dict[str, Any], channel: Optional[str] = None)
 def send_high_priority_alert(state: Dict[str, Any], channel: Optional[str] = None) -> Optional[str]:
     """Send high-priority alert using the global Slack notifier."""
     return slack_notifier.send_high_priority_alert(state, channel)
+
+def send_lead_digest(states: List[Dict[str, Any]], channel: Optional[str] = None) -> Optional[str]:
+    """Send a multi-lead digest using the global Slack notifier."""
+    return slack_notifier.send_lead_digest(states, channel)
+
+async def send_lead_digest_async(states: List[Dict[str, Any]], channel: Optional[str] = None) -> Optional[str]:
+    """Send a multi-lead digest from within a running event loop."""
+    async with vendor_semaphore("slack"):
+        return await slack_notifier.send_lead_digest_async(states, channel)
+
+async def send_high_priority_alert_async(state: Dict[str, Any], channel: Optional[str] = None) -> Optional[str]:
+    """Send a high-priority alert from within a running event loop."""
+    async with vendor_semaphore("slack"):
+        return await slack_notifier.send_high_priority_alert_async(state, channel)
+
+async def _post_digest(states: List[Dict[str, Any]]) -> List[Optional[str]]:
+    """Post one digest for a batch of leads; every lead shares the message timestamp."""
+    message_ts = await send_lead_digest_async(states)
+    return [message_ts] * len(states)
+
+# Global digest batcher; flushed on application shutdown
+slack_batcher = AsyncBatcher(_post_digest, max_batch_size=SLACK_DIGEST_SIZE, max_delay=SLACK_DIGEST_WAIT)
+
+async def dispatch_notifications(state: Dict[str, Any]) -> Optional[str]:
+    """
+    Notify Slack about a processed lead.
+    
+    High-priority leads are alerted immediately; the rest are queued into
+    a digest. The outcome is recorded in the state's notifications/errors.
+    
+    Args:
+        state: Lead processing state
+        
+    Returns:
+        Notification id (e.g. "slack:<ts>") or None if nothing was sent
+    """
+    try:
+        if state.get("score", 0) >= HIGH_PRIORITY_SCORE:
+            slack_ts = await send_high_priority_alert_async(state)
+            notification = f"high_priority_slack:{slack_ts}" if slack_ts else None
+        else:
+            slack_ts = await slack_batcher.process_batched(state)
+            notification = f"slack:{slack_ts}" if slack_ts else None
+    except Exception as e:
+        logger.error("Slack notification failed: {}", e)
+        state.setdefault("errors", []).append(f"slack_notification_failed: {e}")
+        return None
+    
+    if notification:
+        state.setdefault("notifications", []).append(notification)
+    return notification
@@ -0,0 +1,97 @@
+import os
+import atexit
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from loguru import logger
+
+# Thread pool backing asyncio.to_thread for blocking vendor SDKs
+THREAD_POOL_SIZE = int(os.getenv("THREAD_POOL_SIZE", "64"))
+
+# Max concurrent calls per vendor, so one hung SDK cannot take every thread
+# (or, for async clients, flood the vendor's rate limit)
+VENDOR_CONCURRENCY = {
+    "pinecone": int(os.getenv("PINECONE_CONCURRENCY", "20")),
+    "slack": int(os.getenv("SLACK_CONCURRENCY", "10")),
+}
+DEFAULT_CONCURRENCY = 10
+
+# One semaphore per (vendor, event loop), mirroring the pooled HTTP clients
+_semaphores: Dict[Tuple[str, asyncio.AbstractEventLoop], asyncio.Semaphore] = {}
+
+def configure_thread_pool():
+    """Size the running loop's default executor (call once at startup)."""
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(
+        ThreadPoolExecutor(max_workers=THREAD_POOL_SIZE, thread_name_prefix="vendor")
+    )
+
+def vendor_semaphore(vendor: str) -> asyncio.Semaphore:
+    """Get the concurrency guard for a vendor on the running loop."""
+    loop = asyncio.get_running_loop()
+    semaphore = _semaphores.get((vendor, loop))
+    if semaphore is None:
+        # Forget semaphores whose event loop has gone away
+        for key in [key for key in _semaphores if key[1].is_closed()]:
+            del _semaphores[key]
+        
+        semaphore = asyncio.Semaphore(VENDOR_CONCURRENCY.get(vendor, DEFAULT_CONCURRENCY))
+        _semaphores[(vendor, loop)] = semaphore
+    return semaphore
+
+async def run_blocking(vendor: str, func: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Run a blocking vendor call in a worker thread without stalling the event loop.
+    
+    Args:
+        vendor: Vendor name, e.g. "pinecone", "slack"
+        func: Blocking callable
+        *args, **kwargs: Passed through to func
+    
+    Returns:
+        The callable's result
+    """
+    async with vendor_semaphore(vendor):
+        return await asyncio.to_thread(func, *args, **kwargs)
+
+# Persistent event loop for synchronous callers of async vendor code, run in a
+# daemon thread and created on first use; its pooled HTTP clients are closed at
+# interpreter exit
+_background_loop: Optional[asyncio.AbstractEventLoop] = None
+_background_loop_lock = threading.Lock()
+
+def _get_background_loop() -> asyncio.AbstractEventLoop:
+    """Get the shared loop used by run_sync."""
+    global _background_loop
+    with _background_loop_lock:
+        if _background_loop is None:
+            _background_loop = asyncio.new_event_loop()
+            threading.Thread(target=_background_loop.run_forever, name="sync-bridge-loop", daemon=True).start()
+            atexit.register(_stop_background_loop)
+        return _background_loop
+
+def _stop_background_loop():
+    """Close the background loop's HTTP clients and stop it."""
+    from tools.http_clients import close_http_clients
+    try:
+        asyncio.run_coroutine_threadsafe(close_http_clients(), _background_loop).result(timeout=5)
+    except Exception as e:
+        logger.error("Failed to close background HTTP clients: {}", e)
+    _background_loop.call_soon_threadsafe(_background_loop.stop)
+
+def run_sync(coro: Awaitable[Any]) -> Any:
+    """
+    Run a coroutine to completion from synchronous code.
+    
+    Uses one persistent background loop, so pooled clients are reused across
+    calls instead of being rebuilt per asyncio.run. Must not be called from
+    the background loop itself.
+    
+    Args:
+        coro: Coroutine to run
+    
+    Returns:
+        The coroutine's result
+    """
+    return asyncio.run_coroutine_threadsafe(coro, _get_background_loop()).result()